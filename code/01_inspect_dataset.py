@@ -1,12 +1,29 @@
 """
 01_inspect_dataset.py
 Quickly scans the data directory and lists the datasets, image counts, and annotation files.
+Frame dimensions come from the TIFF headers only (no pixel decode).
 """
 
 import os
 import glob
+import sys
+from collections import Counter
 
-DATA_DIR = "data_full"
+from afm_cell_training.tiff import read_tiff_header
+
+DATA_DIR = sys.argv[1] if len(sys.argv) > 1 else "data_full"
+
+def describe_frames(tifs):
+    """'640x480x3 (raw) x26' style summary of the frame geometries in a dataset."""
+    shapes = Counter()
+    for t in tifs:
+        hdr = read_tiff_header(t)
+        if hdr is None:
+            shapes["unreadable"] += 1
+            continue
+        comp = "raw" if hdr.uncompressed else f"compression={hdr.compression}"
+        shapes[f"{hdr.width}x{hdr.height}x{hdr.samples_per_pixel} ({comp})"] += 1
+    return ", ".join(f"{k} x{n}" for k, n in sorted(shapes.items()))
 
 def inspect():
     datasets = sorted(os.listdir(DATA_DIR))
@@ -14,7 +31,7 @@ def inspect():
         ds_path = os.path.join(DATA_DIR, ds)
         if os.path.isdir(ds_path):
             tifs = glob.glob(os.path.join(ds_path, "*.tif"))
-            
+
             # count annotation jsons in all expected places:
             jsons = []
             jsons += glob.glob(os.path.join(ds_path, "*.json"))                                 # root
@@ -22,6 +39,8 @@ def inspect():
             jsons += glob.glob(os.path.join(DATA_DIR, f"{ds}_annotations", "*.json"))           # DN*-rate_annotations/
 
             print(f"{ds}: {len(tifs)} images, {len(jsons)} jsons")
+            if tifs:
+                print(f"  frames: {describe_frames(tifs)}")
 
 if __name__ == "__main__":
     inspect()
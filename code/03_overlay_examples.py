@@ -1,57 +1,81 @@
 import os
-import cv2
-import numpy as np
-
-DATA_ROOT = "data_full"
-
-def generate_overlay(image, mask):
-    overlay = image.copy()
-    overlay[mask > 0] = [255, 0, 0]  # red mask overlay
-    blended = cv2.addWeighted(image, 0.7, overlay, 0.3, 0)
-    return blended
-
-for dataset in sorted(os.listdir(DATA_ROOT)):
-    mask_dir = os.path.join(DATA_ROOT, dataset, "masks")
-    overlay_dir = os.path.join(DATA_ROOT, dataset, "overlays")
-    image_dir = os.path.join(DATA_ROOT, dataset)
-
-    print(f"[check] Dataset: {dataset}")
-    if not os.path.exists(mask_dir):
-        print(f"[skip] No mask dir: {mask_dir}")
-        continue
-
-    os.makedirs(overlay_dir, exist_ok=True)
-    mask_files = sorted(f for f in os.listdir(mask_dir) if f.endswith("_mask.png"))
-    if not mask_files:
-        print(f"[skip] No mask files in: {mask_dir}")
-        continue
-
-    for mask_file in mask_files:
-        base = mask_file.replace("_mask.png", "")
-        mask_path = os.path.join(mask_dir, mask_file)
-        image_path = os.path.join(image_dir, f"{base}.tif")
-        overlay_path = os.path.join(overlay_dir, f"{base}_overlay.png")
-
-        print(f"[debug] Processing {base}...")
-
-        if not os.path.exists(image_path):
-            print(f"  [missing] Image not found: {image_path}")
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from afm_cell_training.overlay import OVERLAY_MODES, overlay_files
+from afm_cell_training.writers import MASK_SUFFIXES, OVERLAY_WRITERS, get_writer, mask_stem
+
+# 30% blue (BGR 255,0,0) tint inside the mask bbox; gray frames are converted once
+COLOR, ALPHA = (255, 0, 0), 0.3
+
+
+def collect(data_root, ext, only_newer):
+    """Yield (dataset, [(image, mask, overlay), ...], up_to_date) per dataset with masks."""
+    for dataset in sorted(os.listdir(data_root)):
+        mask_dir = os.path.join(data_root, dataset, "masks")
+        overlay_dir = os.path.join(data_root, dataset, "overlays")
+        image_dir = os.path.join(data_root, dataset)
+        if not os.path.isdir(mask_dir):
             continue
 
-        try:
-            image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-            if image is None:
-                print(f"  [fail] Could not read image: {image_path}")
+        os.makedirs(overlay_dir, exist_ok=True)
+        # binary "_mask.<ext>" or uint16 instance-labelled "_masks.<ext>", any mask writer's ext
+        mask_files = sorted(f for f in os.listdir(mask_dir) if f.endswith(MASK_SUFFIXES))
+        items, fresh = [], 0
+        for mask_file in mask_files:
+            base = mask_stem(mask_file)
+            mask_path = os.path.join(mask_dir, mask_file)
+            overlay_path = os.path.join(overlay_dir, f"{base}_overlay{ext}")
+            if only_newer and os.path.exists(overlay_path) \
+                    and os.path.getmtime(overlay_path) >= os.path.getmtime(mask_path):
+                fresh += 1
                 continue
+            items.append((os.path.join(image_dir, f"{base}.tif"), mask_path, overlay_path))
+        yield dataset, items, fresh
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Render overlays for every mask.")
+    ap.add_argument("data_root", nargs="?", default="data_full")
+    ap.add_argument("--format", choices=OVERLAY_WRITERS, default="png",
+                    help="Overlay writer backend (default: png)")
+    ap.add_argument("--mode", choices=OVERLAY_MODES, default="fill",
+                    help="Tint the mask (fill) or outline it (contour) (default: fill)")
+    ap.add_argument("--jobs", "-j", type=int, default=0,
+                    help="Worker processes (0 = all cores; default: 0)")
+    ap.add_argument("--chunksize", type=int, default=32,
+                    help="Overlays per work item (default: 32)")
+    ap.add_argument("--only-newer", action="store_true",
+                    help="Only redo overlays older than their mask (or missing)")
+    args = ap.parse_args()
+
+    writer = get_writer(args.format, "overlay")
+    jobs = args.jobs or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # submit every dataset up front so the pool stays busy across dataset boundaries
+        pending = []
+        for dataset, items, fresh in collect(args.data_root, writer.ext, args.only_newer):
+            chunks = [items[i:i + args.chunksize] for i in range(0, len(items), args.chunksize)]
+            futures = [pool.submit(overlay_files, c, writer.name, COLOR, ALPHA, args.mode) for c in chunks]
+            pending.append((dataset, chunks, futures, fresh))
+
+        for dataset, chunks, futures, fresh in pending:
+            counts = Counter()
+            failed = []
+            for chunk, fut in zip(chunks, futures):
+                for (image_path, _, _), status in zip(chunk, fut.result()):
+                    counts[status] += 1
+                    if status != "ok":
+                        failed.append(f"  [{status}] {image_path}")
+            print(f"== {dataset}: ok={counts.pop('ok', 0)}; up_to_date={fresh}"
+                  + "".join(f"; {k}={v}" for k, v in sorted(counts.items())))
+            for line in failed[:5]:
+                print(line)
+            if len(failed) > 5:
+                print(f"  ... {len(failed) - 5} more")
 
-            mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
-            if mask is None:
-                print(f"  [fail] Could not read mask: {mask_path}")
-                continue
 
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
-            overlay = generate_overlay(image_rgb, mask)
-            cv2.imwrite(overlay_path, overlay)
-            print(f"  [ok] Wrote overlay: {overlay_path}")
-        except Exception as e:
-            print(f"  [error] Failed to process {base}: {e}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 # 04_summarize_masks.py
-import json
 from pathlib import Path
 import csv
-import ast
+
+from afm_cell_training.annotation_store import load_annotations
+from afm_cell_training.writers import MASK_SUFFIXES
 
 DATA_DIR = Path("data_full")
 RESULTS_DIR = Path("results")
@@ -16,28 +17,19 @@ def summarize_masks(subfolder):
     # Count how many masks were written
     mask_path = DATA_DIR / subfolder / "masks"
     if mask_path.exists():
-        masks_written = len(list(mask_path.glob("*.png")))
+        masks_written = sum(1 for p in mask_path.iterdir() if p.name.endswith(MASK_SUFFIXES))
 
     # Look in annotations subdir for *_im_annotations.json
     annotation_dir = DATA_DIR / subfolder / "annotations"
     if annotation_dir.exists():
         for f in annotation_dir.glob("*_im_annotations.json"):
             try:
-                with open(f) as jf:
-                    annotations = json.load(jf)
-                for key_str, label in annotations.items():
-                    try:
-                        ast.literal_eval(key_str)
-                    except Exception:
-                        continue
-                    if isinstance(label, dict):
-                        if label.get("selection") == "manual":
-                            manual_in_json += 1
-                        elif label.get("selection") == "exclude":
-                            exclude_in_json += 1
+                store = load_annotations(f)   # tuple keys only, parsed once
             except Exception as e:
                 print(f"[error] failed to parse {f}: {e}")
                 continue
+            manual_in_json += len(store.rows("manual"))
+            exclude_in_json += len(store.rows("exclude"))
 
     return {
         "dataset": subfolder,
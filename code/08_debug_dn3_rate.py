@@ -8,7 +8,9 @@ Diagnose why a RATE dataset might have fewer masks than manual annotations.
 """
 
 from pathlib import Path
-import json, re
+import re
+
+from afm_cell_training.annotation_store import load_annotations
 
 DATA_DIR = Path("data")
 TARGET = "DN3-rate"  # <-- change to DN1-rate, DN2-rate, DN4-rate as needed
@@ -16,31 +18,27 @@ TARGET = "DN3-rate"  # <-- change to DN1-rate, DN2-rate, DN4-rate as needed
 IMG_DIR = DATA_DIR / TARGET
 ANN_DIR = DATA_DIR / f"{TARGET}_annotations"
 
-TUPLE = re.compile(r"\('(\d+)',\s*'(\d+)'\)")
 def stem(cell, meas): return f"cell{int(cell):02d}meas{int(meas):04d}".lower()
 
 # load im_annotations (polygons)
 jpath = next((p for p in ANN_DIR.glob("*_im_annotations.json")), None)
 if not jpath:
     raise SystemExit(f"[err] No *_im_annotations.json in {ANN_DIR}")
-ann = json.loads(jpath.read_text())
+store = load_annotations(jpath)
 
 # index images
 idx = {p.stem.lower(): p for p in IMG_DIR.glob("*") if p.suffix.lower() in {".tif",".tiff",".png",".jpg",".jpeg"}}
 print("found images:", len(idx))
 
-manual = [k for k,v in ann.items() if isinstance(v, dict) and v.get("selection")=="manual"]
+manual = store.rows("manual")
 print("manual keys:", len(manual))
 
 missing = []
-for k in manual:
-    m = TUPLE.fullmatch(k.strip())
-    if not m:
-        continue
-    cell, meas_ = m.group(1), m.group(2)
-    s = stem(cell, meas_)
+for i in manual:
+    k = store.key(i)
+    cell, mv = store.key_at(i)
+    s = stem(cell, mv)
     candidates = [s]
-    mv = int(meas_)
     for delta in (-1, -2, +1):  # common off-by patterns
         candidates.append(stem(cell, f"{mv+delta:04d}"))
     found = next((c for c in candidates if c in idx), None)
@@ -5,7 +5,9 @@ Remove mask files that don't correspond to a manual annotation key
 """
 
 from pathlib import Path
-import json, re
+
+from afm_cell_training.annotation_store import load_annotations
+from afm_cell_training.writers import mask_stem
 
 DATA_DIR = Path("data")
 MASKS_DIR = Path("masks")
@@ -25,29 +27,25 @@ if not ann_file.exists() and ann_dir_rate.exists():
 if not ann_file or not ann_file.exists():
     raise SystemExit(f"[err] Could not find im_annotations for {DATASET}")
 
-ann = json.loads(ann_file.read_text())
+store = load_annotations(ann_file)
 
-TUPLE = re.compile(r"\('(\d+)',\s*'(\d+)'\)")
 def stem(cell, meas): return f"cell{int(cell):02d}meas{int(meas):04d}".lower()
 
 # allowed stems from manual keys (+ meas-1 fallback)
 allowed = set()
-for k, v in ann.items():
-    if isinstance(v, dict) and v.get("selection") == "manual":
-        m = TUPLE.fullmatch(k.strip())
-        if not m: 
-            continue
-        cell, meas = m.group(1), m.group(2)
-        mv = int(meas)
-        allowed.add(stem(cell, meas))
-        allowed.add(stem(cell, f"{mv-1:04d}"))
+for i in store.rows("manual"):
+    cell, mv = store.key_at(i)
+    allowed.add(stem(cell, mv))
+    allowed.add(stem(cell, mv - 1))
 
 removed = 0
 if not mask_dir.exists():
     raise SystemExit(f"[err] No mask dir: {mask_dir}")
 
-for mpath in mask_dir.glob("*_mask.png"):
-    base = mpath.stem.replace("_mask", "").lower()
+# binary "_mask.<ext>" and instance-labelled "_masks.<ext>", for every mask writer's ext
+mask_paths = sorted(p for p in mask_dir.iterdir() if mask_stem(p.name) is not None)
+for mpath in mask_paths:
+    base = mask_stem(mpath.name).lower()
     if base not in allowed:
         print("[rm]", mpath.name)
         try:
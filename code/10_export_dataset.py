@@ -3,6 +3,8 @@
 
 import os, glob, shutil, argparse, fnmatch
 
+from afm_cell_training.tiff import image_size
+
 # Find a mask path for a given base (tries _masks/_mask and png/tif/tiff; falls back to wildcard)
 def find_mask_path(mask_dir, base):
     # try exact matches first
@@ -30,6 +32,18 @@ def find_mask_path(mask_dir, base):
 
     return sorted(hits, key=len)[0] if hits else None
 
+# Check that image and mask have the same H x W, from the TIFF/PNG headers only (no pixel decode)
+def pair_mismatch(img_path, mask_path):
+    img = image_size(img_path)
+    if img is None:
+        return "unreadable image"
+    mask = image_size(mask_path)
+    if mask is None:
+        return "unreadable mask"
+    if img != mask:
+        return f"size mismatch {img[1]}x{img[0]} vs mask {mask[1]}x{mask[0]}"
+    return None
+
 def main():
     # Parse CLI args (explicit inputs + optional image filter)
     ap = argparse.ArgumentParser(description="Flatten datasets for Cellpose training.")
@@ -39,6 +53,9 @@ def main():
                     help="Output folder (default: afm_dataset)")
     ap.add_argument("--image-glob", default=None,
                     help='Filter images by glob, e.g. "*meas0000.tif". If omitted, use all .tif/.tiff.')
+    ap.add_argument("--verify", action="store_true",
+                    help="Skip pairs whose image/mask header is unreadable or whose sizes differ "
+                         "(reads headers only; each skipped pair is listed).")
     args = ap.parse_args()
 
     # Expand any unexpanded globs and make absolute paths
@@ -51,7 +68,7 @@ def main():
     # Ensure output directory exists
     os.makedirs(args.output, exist_ok=True)
 
-    total_pairs, total_missing = 0, 0
+    total_pairs, total_missing, total_skipped = 0, 0, 0
 
     for input_dir in input_dirs:
         if not os.path.isdir(input_dir):
@@ -86,6 +103,13 @@ def main():
                 missing_here += 1
                 continue
 
+            if args.verify:
+                problem = pair_mismatch(os.path.join(input_dir, tif_file), mask_path)
+                if problem:
+                    print(f"   ⚠️  Skipping {tif_file}: {problem}")
+                    total_skipped += 1
+                    continue
+
             mask_ext = os.path.splitext(mask_path)[1]
             out_img  = f"{dataset}_{tif_file}"
             out_mask = f"{dataset}_{base}_masks{mask_ext}"
@@ -100,6 +124,8 @@ def main():
     print(f"✅ Exported {total_pairs} pair(s) → {args.output}")
     if total_missing:
         print(f"⚠️  Missing masks for {total_missing} image(s) total")
+    if total_skipped:
+        print(f"⚠️  Skipped {total_skipped} pair(s) that failed --verify")
 
 if __name__ == "__main__":
     main()
@@ -1,16 +1,17 @@
-import json
 import re
 
 import cv2
 import numpy as np
 from pyrtz2.src.components.image import process_image
 
+from afm_cell_training.annotation_store import load_annotations
+from afm_cell_training.annotation_stream import find_entry
+
 image_file = "data/cell25meas0000.tif"
 labels = ["cell", "meas"]
 im_annotations_file = "data/DN1-rapid_im_annotations.json"
 
-with open(im_annotations_file, "r") as f:
-    im_annotations = json.load(f)
+store = load_annotations(im_annotations_file)
 
 image = cv2.imread(image_file)
 
@@ -23,14 +24,13 @@ else:
 
 
 def return_full_key(keys):
-    for im_key in im_annotations.keys():
-        if keys[0] == eval(im_key)[0]:
-            return im_key
-    return None
+    """First key (in file order) annotated on this cell."""
+    rows = store.cell_rows(int(keys[0]))
+    return store.key(int(rows[0])) if len(rows) else None
 
 
 full_key = return_full_key(keys)
-im_annotation = im_annotations[full_key]
+im_annotation = find_entry(im_annotations_file, full_key)  # the untouched entry process_image expects
 
 image_label = process_image(image, im_annotation)  # type: ignore
 
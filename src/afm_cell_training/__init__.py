@@ -1,2 +1,74 @@
-def main() -> None:
-    print("Hello from afm-cell-training!")
+"""AFM cell mask generation (DN1–DN4, rapid + rate)."""
+
+from .annotation_diff import AnnotationDiff, AnnotationSnapshot
+from .annotation_store import AnnotationStore, load_annotations
+from .annotation_stream import find_entry, iter_annotations
+from .annotations import (
+    TUPLE_KEY_RE,
+    AnnotationKey,
+    find_rapid_annotations,
+    find_rate_annotations,
+    key_of,
+    parse_key,
+)
+from .catalog_db import CatalogDB
+from .cli import main
+from .consensus import ConsensusBuilder
+from .frames import map_frame, read_frame
+from .gallery import Gallery
+from .masks import MaskRasterizer, rasterize_crop, rasterize_labels, rasterize_mask
+from .matching import ImageCatalog, choose_rapid_image, choose_rate_image, find_images, stem_for
+from .ondemand import FrameSource, get_mask, get_pair, set_cache_limit
+from .overlay import render_overlay
+from .pipeline import DatasetReport, FrameJob, MaskPipeline, RenderOptions
+from .rle import RLEMask
+from .stages import IOConfig
+from .tiff import TiffHeader, image_size, read_tiff_header
+from .writers import WRITERS, ImageWriter, get_writer
+
+__all__ = [
+    "AnnotationDiff",
+    "AnnotationKey",
+    "AnnotationSnapshot",
+    "AnnotationStore",
+    "CatalogDB",
+    "ConsensusBuilder",
+    "DatasetReport",
+    "FrameJob",
+    "FrameSource",
+    "Gallery",
+    "IOConfig",
+    "ImageCatalog",
+    "ImageWriter",
+    "MaskPipeline",
+    "MaskRasterizer",
+    "RLEMask",
+    "RenderOptions",
+    "TUPLE_KEY_RE",
+    "TiffHeader",
+    "WRITERS",
+    "choose_rapid_image",
+    "choose_rate_image",
+    "find_entry",
+    "find_images",
+    "find_rapid_annotations",
+    "find_rate_annotations",
+    "get_mask",
+    "get_pair",
+    "get_writer",
+    "image_size",
+    "iter_annotations",
+    "key_of",
+    "load_annotations",
+    "main",
+    "map_frame",
+    "parse_key",
+    "rasterize_crop",
+    "rasterize_labels",
+    "rasterize_mask",
+    "read_frame",
+    "read_tiff_header",
+    "render_overlay",
+    "set_cache_limit",
+    "stem_for",
+]
@@ -0,0 +1,101 @@
+"""
+Key-level diffing of an annotation file against the last run's snapshot.
+
+Each dataset keeps, per annotation key, the entry digest, its selection and
+the stem of the frame it was drawn on:
+
+    <dataset>/.afm_annotation_snapshot.json
+        {"('03', '0001')": {"sha": "...", "selection": "manual", "frame": "cell03meas0001"}}
+
+Keys are classified as added, changed (same selection, new content), removed,
+or switched (selection changed, e.g. manual -> exclude). Only frames touched
+by added/changed/switched keys need re-rasterizing; masks that belonged only
+to removed or no-longer-manual keys are deleted.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+import json
+
+from .utils import atomic_write_bytes, load_json
+
+SNAPSHOT_NAME = ".afm_annotation_snapshot.json"
+
+
+@dataclass
+class KeyState:
+    sha: str
+    selection: str | None
+    frame: str | None = None   # stem of the matched frame, for manual keys
+
+
+@dataclass
+class AnnotationDiff:
+    added: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    switched: list[tuple[str, str | None, str | None]] = field(default_factory=list)  # key, old, new
+    unchanged: int = 0
+
+    @property
+    def dirty_keys(self) -> set[str]:
+        """Keys whose current entry must be (re)rasterized if manual."""
+        return {*self.added, *self.changed, *(k for k, _, _ in self.switched)}
+
+    @property
+    def gone_keys(self) -> set[str]:
+        """Keys that used to be manual and no longer are (removed or switched away)."""
+        return {*self.removed, *(k for k, old, new in self.switched if old == "manual" and new != "manual")}
+
+    def summary(self) -> str:
+        to_manual = sum(1 for _, _, new in self.switched if new == "manual")
+        return (f"added={len(self.added)}; changed={len(self.changed)}; removed={len(self.removed)}; "
+                f"switched={len(self.switched)} (to manual={to_manual}); unchanged={self.unchanged}")
+
+    def lines(self, limit: int = 20) -> list[str]:
+        rows = ([f"  [+] {k}" for k in self.added] + [f"  [~] {k}" for k in self.changed]
+                + [f"  [-] {k}" for k in self.removed]
+                + [f"  [{old} -> {new}] {k}" for k, old, new in self.switched])
+        if len(rows) > limit:
+            rows = rows[:limit] + [f"  ... {len(rows) - limit} more"]
+        return rows
+
+
+def diff_states(prev: dict[str, KeyState], cur: dict[str, KeyState]) -> AnnotationDiff:
+    diff = AnnotationDiff()
+    for k, st in cur.items():
+        old = prev.get(k)
+        if old is None:
+            diff.added.append(k)
+        elif old.selection != st.selection:
+            diff.switched.append((k, old.selection, st.selection))
+        elif old.sha != st.sha:
+            diff.changed.append(k)
+        else:
+            diff.unchanged += 1
+    diff.removed = [k for k in prev if k not in cur]
+    return diff
+
+
+class AnnotationSnapshot:
+    """Per-key state of the annotations as of the last completed run of one dataset."""
+
+    def __init__(self, ds_folder: Path):
+        self.path = ds_folder / SNAPSHOT_NAME
+        raw = load_json(self.path)
+        self.exists = isinstance(raw, dict)
+        self.states: dict[str, KeyState] = {k: KeyState(**v) for k, v in (raw or {}).items()}
+        self.dirty = False
+
+    def diff(self, cur: dict[str, KeyState]) -> AnnotationDiff:
+        return diff_states(self.states, cur)
+
+    def update(self, cur: dict[str, KeyState]) -> None:
+        self.states = cur
+        self.dirty = True
+
+    def save(self) -> None:
+        if self.dirty:
+            data = {k: vars(st) for k, st in self.states.items()}
+            atomic_write_bytes(self.path, json.dumps(data, indent=0, sort_keys=True).encode())
+            self.dirty = False
@@ -0,0 +1,425 @@
+"""
+Compiled, columnar form of an annotation JSON, loadable by mmap with no parsing.
+
+Each `*_annotations.json` is compiled once into a sibling folder of .npy
+columns and rebuilt only when the JSON's size or mtime changes:
+
+    <json dir>/.afm_store/<json stem>/
+        meta.json          source size/mtime, selection names, STORE_VERSION
+        keys.npy           (n,)  original key strings, e.g. "('03', '0001')"
+        cell.npy meas.npy  (n,)  int32
+        selection.npy      (n,)  uint8 index into meta["selections"] (None = not a dict / no selection)
+        digest.npy         (n,)  sha1 of the entry's canonical JSON (fingerprints, diffs)
+        key_offsets.npy    (n+1,) int64: polygons of key i are [key_offsets[i], key_offsets[i+1])
+        poly_offsets.npy   (p+1,) int64: vertices of polygon j are [poly_offsets[j], poly_offsets[j+1])
+        vertices.npy       (v, 2) int32 x, y
+
+Files over STREAM_BYTES are compiled entry by entry through
+annotation_stream.iter_annotations, so memory is bounded by the store
+itself rather than by the parsed JSON.
+
+Keys that are not "(cell, meas)" tuples are left out, as the pipeline
+ignores them. Polygons are converted exactly as rasterization does
+(np.int32, truncating); ones that are not a list of [x, y] pairs are dropped.
+
+`open_all(paths)` brings many files up to date at once: stale ones are
+compiled in parallel on a process pool (each worker writes its store), then
+every store is memory-mapped in the caller, with per-file read / parse /
+build timings.
+
+Scripts should go through `load_annotations(path)`, which opens each file's
+store at most once per process (re-opening only when the file changes) and
+offers lookup by (cell, meas), by cell, or for whole arrays of keys at once.
+"""
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+import json
+import shutil
+import tempfile
+import threading
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from .annotation_stream import iter_annotations
+from .annotations import AnnotationKey, key_of
+from .fingerprints import entry_digest
+from .utils import ensure_dir, load_json, loads_json
+
+STORE_VERSION = 1
+STORE_DIR = ".afm_store"
+STREAM_BYTES = 256 << 20   # larger JSONs are compiled incrementally
+COLUMNS = ("keys", "cell", "meas", "selection", "digest", "key_offsets", "poly_offsets", "vertices")
+
+
+def store_dir_for(json_path: Path) -> Path:
+    return json_path.parent / STORE_DIR / json_path.stem
+
+
+@dataclass
+class AnnotationStore:
+    source: Path
+    keys: np.ndarray
+    cell: np.ndarray
+    meas: np.ndarray
+    selection: np.ndarray
+    selections: list[str | None]
+    digest: np.ndarray
+    key_offsets: np.ndarray
+    poly_offsets: np.ndarray
+    vertices: np.ndarray
+    dropped_polygons: int = 0
+    _index: dict | None = field(default=None, repr=False)
+    _sorted: tuple | None = field(default=None, repr=False)
+
+    # -------------- Build / load ----------------
+    @classmethod
+    def is_fresh(cls, json_path: Path) -> bool:
+        """True if `json_path` has a complete store matching its current size and mtime."""
+        return _fresh_meta(Path(json_path)) is not None
+
+    @classmethod
+    def open(cls, json_path: Path) -> "AnnotationStore":
+        """mmap the compiled store for `json_path`, compiling it first if missing or stale."""
+        json_path = Path(json_path)
+        return cls._mmap(json_path) or cls.compile(json_path)
+
+    @classmethod
+    def _mmap(cls, json_path: Path) -> "AnnotationStore | None":
+        """The on-disk store if it is complete and matches the JSON, else None."""
+        meta = _fresh_meta(json_path)
+        if meta is None:
+            return None
+        folder = store_dir_for(json_path)
+        try:
+            cols = {c: np.load(folder / f"{c}.npy", mmap_mode="r") for c in COLUMNS}
+        except (OSError, ValueError):
+            return None   # half-written, swapped out under us, or foreign files: rebuild
+        return cls(json_path, selections=meta["selections"],
+                   dropped_polygons=meta.get("dropped_polygons", 0), **cols)
+
+    @classmethod
+    def compile(cls, json_path: Path, timings: "LoadTiming | None" = None) -> "AnnotationStore":
+        json_path = Path(json_path)
+        st = json_path.stat()
+        t0 = time.perf_counter()
+        if st.st_size > STREAM_BYTES:
+            return _drain(cls.stream(json_path, timings))
+        raw = json_path.read_bytes()
+        t1 = time.perf_counter()
+        data = loads_json(raw)
+        t2 = time.perf_counter()
+        store = cls.from_dict(json_path, data if isinstance(data, dict) else {})
+        # never persist a parse failure (e.g. a file mid-write); if another writer
+        # swapped its store in first, use theirs
+        if isinstance(data, dict) and not store.save(st.st_size, st.st_mtime_ns):
+            store = cls._mmap(json_path) or store
+        if timings is not None:
+            timings.compiled = True
+            timings.mb = len(raw) / 1e6
+            timings.read, timings.parse, timings.build = t1 - t0, t2 - t1, time.perf_counter() - t2
+        return store
+
+    @classmethod
+    def from_dict(cls, source: Path, ann: dict) -> "AnnotationStore":
+        return cls.from_items(source, ann.items())
+
+    @classmethod
+    def from_items(cls, source: Path, items) -> "AnnotationStore":
+        """Build from (key, entry) pairs in file order, e.g. a dict's items or a stream."""
+        builder = _StoreBuilder()
+        for k, entry in items:
+            builder.add(k, entry)
+        return builder.build(source)
+
+    @classmethod
+    def stream(cls, json_path: Path, timings: "LoadTiming | None" = None):
+        """Compile `json_path` entry by entry, yielding a StreamedEntry per key as it is parsed.
+
+        The generator's return value is the finished store, saved as `compile`
+        saves it (`store = yield from AnnotationStore.stream(path)`). A
+        malformed file ends the stream early and returns an empty, unsaved store.
+        """
+        json_path = Path(json_path)
+        st = json_path.stat()
+        t0 = time.perf_counter()
+        builder = _StoreBuilder()
+        try:
+            for k, entry in iter_annotations(json_path):
+                row = builder.add(k, entry)
+                if row is not None:
+                    yield row
+        except ValueError:
+            store, ok = _StoreBuilder().build(json_path), False
+        else:
+            store, ok = builder.build(json_path), True
+        if ok and not store.save(st.st_size, st.st_mtime_ns):
+            store = cls._mmap(json_path) or store
+        if timings is not None:
+            timings.compiled = timings.streamed = True
+            timings.mb = st.st_size / 1e6
+            timings.build = time.perf_counter() - t0   # read, parse and build interleave
+        return store
+
+    def _last_per_key(self) -> "AnnotationStore":
+        """Repeats of one key string (only a stream has them) resolve as in a dict: first position, last value."""
+        names = self.keys.tolist()
+        last = {k: i for i, k in enumerate(names)}
+        if len(last) == len(names):
+            return self
+        return self.take([last[k] for k in dict.fromkeys(names)])
+
+    def take(self, rows: list[int]) -> "AnnotationStore":
+        """A new store holding only `rows`, in that order."""
+        polys = [self.polygons(i) for i in rows]
+        flat = [v for p in polys for v in p]
+        return replace(
+            self, keys=self.keys[rows], cell=self.cell[rows], meas=self.meas[rows],
+            selection=self.selection[rows], digest=self.digest[rows],
+            key_offsets=np.concatenate([[0], np.cumsum([len(p) for p in polys])]).astype(np.int64),
+            poly_offsets=np.concatenate([[0], np.cumsum([len(v) for v in flat])]).astype(np.int64),
+            vertices=np.concatenate(flat) if flat else np.zeros((0, 2), dtype=np.int32),
+            _index=None, _sorted=None)
+
+    def save(self, source_size: int, source_mtime_ns: int) -> bool:
+        """Write every column to a private temp folder, then swap it in.
+
+        Returns False if a concurrent writer (thread or process) swapped its
+        own store in first; theirs is kept and the temp folder dropped.
+        """
+        folder = store_dir_for(self.source)
+        ensure_dir(folder.parent)
+        tmp = Path(tempfile.mkdtemp(prefix=f".{folder.name}.tmp-", dir=folder.parent))
+        for c in COLUMNS:
+            np.save(tmp / f"{c}.npy", np.ascontiguousarray(getattr(self, c)), allow_pickle=False)
+        meta = {"version": STORE_VERSION, "source_size": source_size, "source_mtime_ns": source_mtime_ns,
+                "selections": self.selections, "dropped_polygons": self.dropped_polygons}
+        (tmp / "meta.json").write_text(json.dumps(meta))   # written last: marks the store complete
+        shutil.rmtree(folder, ignore_errors=True)
+        try:
+            tmp.rename(folder)
+        except OSError:   # someone else's store landed between the rmtree and the rename
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False
+        return True
+
+    # -------------- Access ----------------
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def code(self, selection: str | None) -> int:
+        """Selection enum value (-1 if no entry uses it)."""
+        return self.selections.index(selection) if selection in self.selections else -1
+
+    def selection_of(self, i: int) -> str | None:
+        return self.selections[self.selection[i]]
+
+    def key(self, i: int) -> str:
+        return str(self.keys[i])
+
+    def key_at(self, i: int) -> AnnotationKey:
+        return AnnotationKey(int(self.cell[i]), int(self.meas[i]))
+
+    def rows(self, selection: str | None = "manual") -> np.ndarray:
+        """Rows whose selection is `selection`, in file order."""
+        return np.flatnonzero(self.selection == self.code(selection))
+
+    def digest_of(self, i: int) -> str:
+        return self.digest[i].decode()
+
+    def polygons(self, i: int) -> list[np.ndarray]:
+        """Key i's polygons as (n, 2) int32 views into the vertex column."""
+        p0, p1 = self.key_offsets[i], self.key_offsets[i + 1]
+        offs = self.poly_offsets[p0:p1 + 1]
+        verts = np.asarray(self.vertices)   # plain ndarray views (they pickle as arrays)
+        return [verts[a:b] for a, b in zip(offs[:-1].tolist(), offs[1:].tolist())]
+
+    def find(self, cell: int, meas: int) -> int | None:
+        """Row of (cell, meas); with duplicate spellings of one key, the last wins, as in a dict."""
+        if self._index is None:
+            self._index = {cm: i for i, cm in enumerate(zip(self.cell.tolist(), self.meas.tolist()))}
+        return self._index.get((int(cell), int(meas)))
+
+    def cell_rows(self, cell: int) -> np.ndarray:
+        """Every row of one cell, in file order."""
+        return np.flatnonzero(self.cell == int(cell))
+
+    def lookup(self, cells, meas) -> np.ndarray:
+        """Rows for arrays of (cell, meas) pairs, -1 where absent; agrees with `find`."""
+        if self._sorted is None:
+            codes = _pair_codes(self.cell, self.meas)
+            order = np.argsort(codes, kind="stable")   # duplicates stay in file order
+            self._sorted = (codes[order], order)
+        codes, order = self._sorted
+        want = _pair_codes(np.asarray(cells), np.asarray(meas))
+        if not len(codes):
+            return np.full(want.shape, -1, dtype=np.int64)
+        pos = np.maximum(np.searchsorted(codes, want, side="right") - 1, 0)   # last equal code = last in file
+        return np.where(codes[pos] == want, order[pos], -1)
+
+
+class StreamedEntry(NamedTuple):
+    """One key as `AnnotationStore.stream` compiles it: the values its store row will hold."""
+    key: str
+    cell: int
+    meas: int
+    selection: str | None
+    digest: str
+    polygons: list
+
+
+class _StoreBuilder:
+    """The columns of a store under construction, appended one entry at a time."""
+
+    def __init__(self):
+        self.keys, self.cells, self.meas, self.sel_codes, self.digests = [], [], [], [], []
+        self.key_offsets, self.poly_offsets, self.verts = [0], [0], []
+        self.selections: list[str | None] = [None]
+        self.codes = {None: 0}
+        self.dropped = 0
+
+    def add(self, k: str, entry) -> StreamedEntry | None:
+        """Append one entry; None (and nothing appended) for keys that are not (cell, meas) tuples."""
+        parsed = key_of(k)
+        if parsed is None:
+            return None
+        is_dict = isinstance(entry, dict)
+        sel = entry.get("selection") if is_dict else None
+        if not isinstance(sel, str):
+            sel = None
+        if sel not in self.codes:
+            self.codes[sel] = len(self.selections)
+            self.selections.append(sel)
+        digest = entry_digest(entry)
+        self.keys.append(k)
+        self.cells.append(parsed.cell)
+        self.meas.append(parsed.meas)
+        self.sel_codes.append(self.codes[sel])
+        self.digests.append(digest)
+        polys = []
+        for poly in ((entry.get("clickData") or []) if is_dict else []):
+            try:
+                v = np.asarray(poly, dtype=np.int32).reshape(-1, 2)
+            except (ValueError, TypeError):
+                self.dropped += 1
+                continue
+            polys.append(v)
+            self.poly_offsets.append(self.poly_offsets[-1] + len(v))
+        self.verts += polys
+        self.key_offsets.append(len(self.poly_offsets) - 1)
+        return StreamedEntry(k, parsed.cell, parsed.meas, sel, digest, polys)
+
+    def build(self, source: Path) -> AnnotationStore:
+        return AnnotationStore(
+            source=Path(source),
+            keys=np.array(self.keys, dtype=str) if self.keys else np.zeros(0, dtype="<U1"),
+            cell=np.array(self.cells, dtype=np.int32),
+            meas=np.array(self.meas, dtype=np.int32),
+            selection=np.array(self.sel_codes, dtype=np.uint8),
+            selections=self.selections,
+            digest=np.array(self.digests, dtype="S40"),
+            key_offsets=np.array(self.key_offsets, dtype=np.int64),
+            poly_offsets=np.array(self.poly_offsets, dtype=np.int64),
+            vertices=np.concatenate(self.verts) if self.verts else np.zeros((0, 2), dtype=np.int32),
+            dropped_polygons=self.dropped,
+        )._last_per_key()
+
+
+def _drain(gen):
+    """Run a generator to the end; its return value."""
+    while True:
+        try:
+            next(gen)
+        except StopIteration as stop:
+            return stop.value
+
+
+def _fresh_meta(json_path: Path) -> dict | None:
+    st = json_path.stat()
+    meta = load_json(store_dir_for(json_path) / "meta.json")
+    if (meta and meta.get("version") == STORE_VERSION and meta.get("source_size") == st.st_size
+            and meta.get("source_mtime_ns") == st.st_mtime_ns):
+        return meta
+    return None
+
+
+def _pair_codes(cells: np.ndarray, meas: np.ndarray) -> np.ndarray:
+    return (cells.astype(np.int64) << 32) | meas.astype(np.int64)
+
+
+# -------------- Bulk loading ----------------
+@dataclass
+class LoadTiming:
+    """Where the time went loading one annotation file (seconds; read/parse/build only if compiled)."""
+    path: Path
+    keys: int = 0
+    mb: float = 0.0
+    compiled: bool = False
+    streamed: bool = False
+    read: float = 0.0
+    parse: float = 0.0
+    build: float = 0.0
+    open: float = 0.0
+
+    def line(self) -> str:
+        if not self.compiled:
+            return f"{self.path.name}: keys={self.keys}; mmap {self.open * 1e3:.1f} ms"
+        if self.streamed:
+            return f"{self.path.name}: keys={self.keys}; {self.mb:.1f} MB streamed in {self.build * 1e3:.0f} ms"
+        return (f"{self.path.name}: keys={self.keys}; {self.mb:.1f} MB read {self.read * 1e3:.0f} ms, "
+                f"parse {self.parse * 1e3:.0f} ms, build {self.build * 1e3:.0f} ms")
+
+
+def compile_file(json_path: str) -> LoadTiming:
+    """Compile one store and time it; module-level for the process pool."""
+    timing = LoadTiming(Path(json_path))
+    timing.keys = len(AnnotationStore.compile(timing.path, timing))
+    return timing
+
+
+def open_all(paths: list[Path], jobs: int = 1,
+             pool: Executor | None = None) -> tuple[dict[Path, AnnotationStore], list[LoadTiming]]:
+    """Compile every stale store in parallel, then mmap them all; ({path: store}, timings)."""
+    paths = list(dict.fromkeys(Path(p) for p in paths))
+    stale = [str(p) for p in paths if not AnnotationStore.is_fresh(p)]
+    if len(stale) > 1 and (pool is not None or jobs > 1):
+        if pool is None:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(stale))) as own:
+                compiled = list(own.map(compile_file, stale))
+        else:
+            compiled = list(pool.map(compile_file, stale))
+    else:
+        compiled = [compile_file(p) for p in stale]
+    timings = {t.path: t for t in compiled}
+
+    stores, out = {}, []
+    for p in paths:
+        t = timings.get(p) or LoadTiming(p)
+        t0 = time.perf_counter()
+        stores[p] = load_annotations(p)
+        t.open, t.keys = time.perf_counter() - t0, len(stores[p])
+        out.append(t)
+    return stores, out
+
+
+# -------------- Per-process cache ----------------
+_loaded: dict[Path, tuple[tuple[int, int], AnnotationStore]] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_annotations(json_path: Path) -> AnnotationStore:
+    """The AnnotationStore for `json_path`, opened once per process and again only when the file changes."""
+    path = Path(json_path).resolve()
+    st = path.stat()
+    sig = (st.st_size, st.st_mtime_ns)
+    with _loaded_lock:
+        hit = _loaded.get(path)
+        if hit is not None and hit[0] == sig:
+            return hit[1]
+    store = AnnotationStore.open(path)
+    with _loaded_lock:
+        _loaded[path] = (sig, store)
+    return store
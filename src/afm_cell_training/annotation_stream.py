@@ -0,0 +1,120 @@
+"""
+Incremental reader for annotation JSONs too big to load whole.
+
+    for key, entry in iter_annotations(path):
+        ...
+    for key, entry in iter_annotations(path, polygons="manual"):
+        ...   # clickData of non-manual entries is skipped, never decoded
+    entry = find_entry(path, "('03', '0001')")   # one untouched entry
+
+The file is read in CHUNK_BYTES pieces and only one top-level entry is held
+at a time, so memory is bounded by the largest single entry. A regex that
+matches only strings and braces finds where each entry ends: brace depth
+alone delimits objects in valid JSON, and clickData (numbers and square
+brackets) is skipped over in C without a Python-level token per vertex.
+Each entry is then decoded on its own; with polygons="manual" (or "none"),
+the entry's members are split the same way and clickData is dropped unless
+the selection is "manual" (or always).
+
+Entries come out in file order, duplicate keys included (a dict would keep
+the last). Truncated or malformed input raises ValueError.
+"""
+
+from pathlib import Path
+from typing import Iterable, Iterator
+import json
+import re
+
+from .utils import parse_json
+
+CHUNK_BYTES = 1 << 20
+POLYGONS = ("all", "manual", "none")
+# a string (group 1 empty if it runs past the buffer), or a brace
+TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*(")?|[{}]', re.DOTALL)
+COLON_RE = re.compile(rb"\s*(:)?")
+
+
+def read_chunks(path: Path, chunk_bytes: int = CHUNK_BYTES) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_bytes):
+            yield chunk
+
+
+def iter_members(chunks: Iterable[bytes]) -> Iterator[tuple[str, bytes]]:
+    """(key, raw value bytes) for each member of the outermost JSON object, as the bytes arrive."""
+    chunks = iter(chunks)
+    buf = bytearray()
+    pos = depth = 0
+    key, start = None, 0
+    eof = False
+    while True:
+        m = TOKEN_RE.search(buf, pos)
+        colon = None
+        complete = m is not None and (m.group(0)[:1] != b'"' or m.group(1) is not None)
+        if complete and depth == 1 and m.group(0)[:1] == b'"':
+            colon = COLON_RE.match(buf, m.end())
+            complete = colon.group(1) is not None or colon.end() < len(buf)   # else: need the next byte
+        if not complete and not eof:
+            if m is None:
+                pos = len(buf)   # nothing token-like left to rescan
+            cut = start if key is not None else pos
+            del buf[:cut]
+            pos -= cut
+            start -= cut if key is not None else 0
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+            else:
+                buf += chunk
+            continue
+        if m is None or not complete:
+            raise ValueError("truncated JSON object")
+
+        tok = m.group(0)
+        pos = m.end()
+        if tok == b"{":
+            depth += 1
+        elif tok == b"}":
+            depth -= 1
+            if depth == 0:
+                if key is not None:
+                    yield key, bytes(buf[start:m.start()]).strip()
+                return
+        elif colon is not None and colon.group(1) is not None:   # a member key of the outer object
+            if key is not None:
+                value = bytes(buf[start:m.start()]).rstrip()
+                if not value.endswith(b","):
+                    raise ValueError(f"expected ',' before key {tok[:40]!r}")
+                yield key, value[:-1].strip()
+            key = json.loads(tok)
+            pos = start = colon.end()
+
+
+def decode_entry(raw: bytes, polygons: str = "all"):
+    """One entry's value, with clickData only for every / manual / no entry (see POLYGONS)."""
+    raw = raw.strip()
+    if polygons == "all" or not raw.startswith(b"{"):
+        return parse_json(raw)
+    members = dict(iter_members([raw]))
+    entry = {k: parse_json(v) for k, v in members.items() if k != "clickData"}
+    if "clickData" in members and polygons == "manual" and entry.get("selection") == "manual":
+        entry["clickData"] = parse_json(members["clickData"])
+    return entry
+
+
+def iter_annotations(path: Path, polygons: str = "all",
+                     chunk_bytes: int = CHUNK_BYTES) -> Iterator[tuple[str, object]]:
+    """(key, entry) for every top-level member of an annotation JSON, read incrementally."""
+    if polygons not in POLYGONS:
+        raise ValueError(f"polygons must be one of {POLYGONS}, not {polygons!r}")
+    for key, raw in iter_members(read_chunks(path, chunk_bytes)):
+        yield key, decode_entry(raw, polygons)
+
+
+def find_entry(path: Path, key: str, chunk_bytes: int = CHUNK_BYTES):
+    """The untouched entry for one key (the last one, as json.load keeps), or None; nothing else is decoded."""
+    raw = None
+    for k, value in iter_members(read_chunks(path, chunk_bytes)):
+        if k == key:
+            raw = value
+    return None if raw is None else parse_json(raw)
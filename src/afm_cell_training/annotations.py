@@ -0,0 +1,91 @@
+"""
+Locating annotation files and parsing their keys.
+
+- RAPID: data/DN?-rapid/DN?-rapid_im_annotations.json
+         (or data/DN?-rapid/annotations/*_im_annotations.json)
+- RATE:  data/DN?-rate_annotations/*_im_annotations.json
+         (or data/DN?-rate/annotations/*_im_annotations.json)
+
+Keys are stringified tuples like "('03', '0001')" -> (cell, meas). They are
+parsed here and nowhere else: `key_of` gives typed AnnotationKey(cell, meas),
+and annotation_store.load_annotations parses a whole file once per process.
+"""
+
+from pathlib import Path
+from typing import NamedTuple
+import re
+
+TUPLE_KEY_RE = re.compile(r"\('(\d+)',\s*'(\d+)'\)")  # matches "('03','0001')"
+
+
+def parse_key(k: str) -> tuple[str, str] | None:
+    """Return (cell_str, meas_str) for a tuple key, or None if it isn't one."""
+    m = TUPLE_KEY_RE.fullmatch(k.strip())
+    if not m:
+        return None
+    return m.group(1), m.group(2)
+
+
+class AnnotationKey(NamedTuple):
+    cell: int
+    meas: int
+
+
+def key_of(k: str) -> AnnotationKey | None:
+    """AnnotationKey(cell, meas) for a tuple key, or None if it isn't one."""
+    parsed = parse_key(k)
+    return AnnotationKey(int(parsed[0]), int(parsed[1])) if parsed else None
+
+
+def _ranked(folder: Path, dataset: str, pattern: str) -> list[Path]:
+    """Matches by name (glob order is arbitrary), `<dataset>_im_annotations.json` first."""
+    found = sorted(folder.glob(pattern)) if folder.is_dir() else []
+    preferred = folder / f"{dataset}_im_annotations.json"
+    if preferred in found:
+        found.remove(preferred)
+        found.insert(0, preferred)
+    return found
+
+
+def rapid_annotation_files(ds_folder: Path, kind: str = "im") -> list[Path]:
+    """Every `<kind>` annotation file of a rapid set, the one `find_rapid_annotations` uses first."""
+    root = ds_folder / f"{ds_folder.name}_{kind}_annotations.json"
+    rest = _ranked(ds_folder / "annotations", ds_folder.name, f"*_{kind}_annotations.json")
+    return [root, *rest] if root.exists() else rest
+
+
+def rate_annotation_files(img_folder: Path) -> list[Path]:
+    """Every annotation file of a rate set, the one `find_rate_annotations` uses first.
+
+    Looks in `<dataset>_annotations/`, then `<dataset>/annotations/`; in each,
+    `*_im_annotations.json`, falling back to any `*.json`.
+    """
+    for folder in (img_folder.parent / f"{img_folder.name}_annotations", img_folder / "annotations"):
+        for pattern in ("*_im_annotations.json", "*.json"):
+            found = _ranked(folder, img_folder.name, pattern)
+            if found:
+                return found
+    return []
+
+
+def annotation_files(ds_folder: Path) -> list[Path]:
+    """Every im annotation file of a rapid or rate dataset (see consensus.py), preferred first."""
+    if ds_folder.name.endswith("-rapid"):
+        return rapid_annotation_files(ds_folder)
+    if ds_folder.name.endswith("-rate"):
+        return rate_annotation_files(ds_folder)
+    return []
+
+
+def find_rapid_annotations(ds_folder: Path, kind: str = "im") -> Path | None:
+    """Rapid sets keep `<dataset>_<kind>_annotations.json` at the dataset root."""
+    return next(iter(rapid_annotation_files(ds_folder, kind)), None)
+
+
+def find_rate_annotations(img_folder: Path) -> Path | None:
+    """Rate sets keep annotations in a sibling `<dataset>_annotations/` folder.
+
+    With several files (see consensus.py for using them all), the one named
+    after the dataset wins, then the first by name.
+    """
+    return next(iter(rate_annotation_files(img_folder)), None)
@@ -0,0 +1,83 @@
+"""
+Encode-speed vs size benchmark for the writer backends.
+
+    afm-cell-training bench-writers data_samples
+
+Uses every frame under the data root that has a mask in masks/, plus the
+overlay rendered from the pair, and encodes them in memory (no disk I/O).
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+import time
+
+import numpy as np
+
+from .frames import read_frame
+from .overlay import render_overlay
+from .writers import MASK_WRITERS, OVERLAY_WRITERS, WRITERS, mask_stem, read_mask
+
+
+@dataclass
+class BenchResult:
+    writer: str
+    kind: str
+    frames: int = 0
+    seconds: float = 0.0
+    nbytes: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def ms_per_frame(self) -> float:
+        return 1000 * self.seconds / self.frames if self.frames else float("nan")
+
+    @property
+    def bytes_per_frame(self) -> float:
+        return self.nbytes / self.frames if self.frames else float("nan")
+
+
+def load_samples(data_dir: Path) -> tuple[list[np.ndarray], list[np.ndarray]]:
+    """(masks, overlays) for every <ds>/<stem>.tif with a <ds>/masks/<stem>_mask(s).* file."""
+    masks, overlays = [], []
+    for mask_path in sorted(Path(data_dir).glob("*/masks/*_mask*.*")):
+        stem = mask_stem(mask_path.name)
+        if stem is None:
+            continue
+        raw = read_frame(mask_path.parent.parent / f"{stem}.tif", "color")
+        mask = read_mask(mask_path)
+        if raw is None or mask is None or mask.shape[:2] != raw.shape[:2]:
+            continue
+        masks.append(mask)
+        overlays.append(render_overlay(raw, mask))
+    return masks, overlays
+
+
+def bench_writers(masks: list[np.ndarray], overlays: list[np.ndarray],
+                  repeat: int = 5) -> list[BenchResult]:
+    """Encode every sample with every applicable backend, best-effort averaged over `repeat`."""
+    results = []
+    for kind, samples, names in (("mask", masks, MASK_WRITERS), ("overlay", overlays, OVERLAY_WRITERS)):
+        for name in names:
+            w = WRITERS[name]
+            r = BenchResult(name, kind)
+            for img in samples:
+                try:
+                    t0 = time.perf_counter()
+                    for _ in range(repeat):
+                        data = w.encode(img)
+                    r.seconds += (time.perf_counter() - t0) / repeat
+                except ValueError as e:
+                    r.errors.append(str(e))
+                    continue
+                r.frames += 1
+                r.nbytes += len(data)
+            results.append(r)
+    return results
+
+
+def print_results(results: list[BenchResult]) -> None:
+    print(f"{'kind':<8} {'writer':<13} {'frames':>6} {'ms/frame':>9} {'bytes/frame':>12}")
+    for r in results:
+        note = f"  [{r.errors[0]}]" if r.errors else ""
+        print(f"{r.kind:<8} {r.writer:<13} {r.frames:>6} {r.ms_per_frame:>9.2f} "
+              f"{r.bytes_per_frame:>12.0f}{note}")
@@ -0,0 +1,220 @@
+"""
+Persistent SQLite catalog of a data root: image frames, annotation keys and masks.
+
+    <data_root>/.afm_catalog.sqlite
+
+`refresh()` stats every file and only re-reads the ones whose (mtime, size)
+changed since the last refresh, so after the first build a refresh costs a
+directory listing per dataset. Queries then run against the DB instead of the
+tree, e.g. all manual keys for cell 03 across the rate datasets:
+
+    with CatalogDB("data_full") as db:
+        db.refresh()
+        db.annotation_keys(cell=3, kind="rate", selection="manual")
+"""
+
+from pathlib import Path
+import sqlite3
+
+from .annotation_stream import iter_annotations
+from .annotations import annotation_files, key_of
+from .matching import STEM_RE, find_images
+from .tiff import image_size
+from .writers import mask_stem
+
+CATALOG_NAME = ".afm_catalog.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path     TEXT PRIMARY KEY,
+    dataset  TEXT NOT NULL,
+    cell     INTEGER,
+    meas     INTEGER,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    width    INTEGER,
+    height   INTEGER
+);
+CREATE TABLE IF NOT EXISTS annotation_files (
+    path     TEXT PRIMARY KEY,
+    dataset  TEXT NOT NULL,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS annotations (
+    file      TEXT NOT NULL REFERENCES annotation_files(path) ON DELETE CASCADE,
+    dataset   TEXT NOT NULL,
+    key       TEXT NOT NULL,
+    cell      INTEGER NOT NULL,
+    meas      INTEGER NOT NULL,
+    selection TEXT,
+    PRIMARY KEY (file, key)
+);
+CREATE TABLE IF NOT EXISTS masks (
+    path     TEXT PRIMARY KEY,
+    dataset  TEXT NOT NULL,
+    stem     TEXT NOT NULL,
+    cell     INTEGER,
+    meas     INTEGER,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_by_cell      ON images(cell, meas);
+CREATE INDEX IF NOT EXISTS annotations_by_cell ON annotations(cell, meas);
+CREATE INDEX IF NOT EXISTS masks_by_dataset    ON masks(dataset);
+"""
+
+
+def dataset_kind(name: str) -> str | None:
+    if name.endswith("-rapid"):
+        return "rapid"
+    if name.endswith("-rate"):
+        return "rate"
+    return None
+
+
+def _cell_meas(stem: str) -> tuple[int | None, int | None]:
+    m = STEM_RE.match(stem.lower())
+    return (int(m.group(1)), int(m.group(2))) if m else (None, None)
+
+
+def _image_dims(p: Path) -> tuple[int | None, int | None]:
+    size = image_size(p)
+    if size is None:
+        return None, None
+    return size[1], size[0]
+
+
+class CatalogDB:
+    """SQLite-backed index of images, annotation keys and masks under `data_root`."""
+
+    def __init__(self, data_root, db_path: Path | None = None):
+        self.data_root = Path(data_root)
+        self.db_path = Path(db_path) if db_path else self.data_root / CATALOG_NAME
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -------------- Refresh ----------------
+    def refresh(self) -> dict[str, int]:
+        """Bring the catalog in line with the tree. Returns counts of re-read files."""
+        stats = {"images": 0, "annotation_files": 0, "masks": 0, "removed": 0}
+        seen: dict[str, set[str]] = {"images": set(), "annotation_files": set(), "masks": set()}
+        with self.conn:
+            for ds in sorted(self.data_root.iterdir()):
+                if not ds.is_dir() or dataset_kind(ds.name) is None:
+                    continue
+                for p in find_images(ds):
+                    seen["images"].add(str(p))
+                    stats["images"] += self._refresh_image(ds.name, p)
+                for p in annotation_files(ds):
+                    seen["annotation_files"].add(str(p))
+                    stats["annotation_files"] += self._refresh_annotations(ds.name, p)
+                mask_dir = ds / "masks"
+                if mask_dir.is_dir():
+                    for p in mask_dir.iterdir():
+                        if mask_stem(p.name) is not None:
+                            seen["masks"].add(str(p))
+                            stats["masks"] += self._refresh_mask(ds.name, p)
+            for table, paths in seen.items():
+                for (path,) in self.conn.execute(f"SELECT path FROM {table}").fetchall():
+                    if path not in paths:
+                        self.conn.execute(f"DELETE FROM {table} WHERE path = ?", (path,))
+                        stats["removed"] += 1
+        return stats
+
+    def _unchanged(self, table: str, p: Path, st) -> bool:
+        row = self.conn.execute(f"SELECT size, mtime_ns FROM {table} WHERE path = ?",
+                                (str(p),)).fetchone()
+        return row is not None and row["size"] == st.st_size and row["mtime_ns"] == st.st_mtime_ns
+
+    def _refresh_image(self, dataset: str, p: Path) -> int:
+        st = p.stat()
+        if self._unchanged("images", p, st):
+            return 0
+        cell, meas = _cell_meas(p.stem)
+        width, height = _image_dims(p)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(p), dataset, cell, meas, st.st_size, st.st_mtime_ns, width, height))
+        return 1
+
+    def _refresh_annotations(self, dataset: str, p: Path) -> int:
+        st = p.stat()
+        if self._unchanged("annotation_files", p, st):
+            return 0
+        self.conn.execute("DELETE FROM annotation_files WHERE path = ?", (str(p),))
+        self.conn.execute("INSERT INTO annotation_files VALUES (?, ?, ?, ?)",
+                          (str(p), dataset, st.st_size, st.st_mtime_ns))
+        rows = []
+        try:   # selections only: clickData is never decoded
+            for k, entry in iter_annotations(p, polygons="none"):
+                parsed = key_of(k)
+                if parsed is None:
+                    continue
+                selection = entry.get("selection") if isinstance(entry, dict) else None
+                rows.append((str(p), dataset, k, parsed.cell, parsed.meas, selection))
+        except ValueError:
+            rows = []   # malformed or mid-write: no keys, as before
+        self.conn.executemany("INSERT OR REPLACE INTO annotations VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return 1
+
+    def _refresh_mask(self, dataset: str, p: Path) -> int:
+        st = p.stat()
+        if self._unchanged("masks", p, st):
+            return 0
+        stem = mask_stem(p.name).lower()
+        cell, meas = _cell_meas(stem)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO masks VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (str(p), dataset, stem, cell, meas, st.st_size, st.st_mtime_ns))
+        return 1
+
+    # -------------- Queries ----------------
+    @staticmethod
+    def _where(dataset=None, kind=None, cell=None, meas=None, **extra) -> tuple[str, list]:
+        clauses, params = [], []
+        if dataset is not None:
+            names = [dataset] if isinstance(dataset, str) else list(dataset)
+            clauses.append(f"dataset IN ({', '.join('?' * len(names))})")
+            params += names
+        if kind is not None:
+            clauses.append("dataset LIKE ?")
+            params.append(f"%-{kind}")
+        for col, val in (("cell", cell), ("meas", meas), *extra.items()):
+            if val is not None:
+                clauses.append(f"{col} = ?")
+                params.append(val)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def datasets(self) -> list[str]:
+        rows = self.conn.execute("SELECT DISTINCT dataset FROM images "
+                                 "UNION SELECT DISTINCT dataset FROM annotations ORDER BY 1")
+        return [r[0] for r in rows]
+
+    def images(self, dataset=None, kind=None, cell=None, meas=None) -> list[sqlite3.Row]:
+        where, params = self._where(dataset, kind, cell, meas)
+        return self.conn.execute(
+            f"SELECT * FROM images{where} ORDER BY dataset, cell, meas", params).fetchall()
+
+    def annotation_keys(self, dataset=None, kind=None, cell=None, meas=None,
+                        selection=None) -> list[sqlite3.Row]:
+        """e.g. annotation_keys(cell=3, kind="rate", selection="manual")"""
+        where, params = self._where(dataset, kind, cell, meas, selection=selection)
+        return self.conn.execute(
+            f"SELECT * FROM annotations{where} ORDER BY dataset, cell, meas, file", params).fetchall()
+
+    def masks(self, dataset=None, kind=None, cell=None, meas=None) -> list[sqlite3.Row]:
+        where, params = self._where(dataset, kind, cell, meas)
+        return self.conn.execute(
+            f"SELECT * FROM masks{where} ORDER BY dataset, stem", params).fetchall()
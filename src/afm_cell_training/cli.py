@@ -0,0 +1,168 @@
+"""Command-line entry point: `afm-cell-training masks [data_dir] --jobs N`, `run`, `catalog`, ..."""
+
+from pathlib import Path
+import argparse
+import os
+import time
+
+from .bench import bench_writers, load_samples, print_results
+from .annotation_store import open_all
+from .annotations import annotation_files
+from .catalog_db import CatalogDB, dataset_kind
+from .consensus import ABSENT, METHODS, ConsensusBuilder
+from .gallery import Gallery
+from .orchestrator import RunOrchestrator
+from .overlay import OVERLAY_MODES
+from .pipeline import MaskPipeline
+from .stages import IOConfig
+from .writers import MASK_WRITERS, OVERLAY_WRITERS
+
+
+def add_mask_args(ap: argparse.ArgumentParser, workers: bool = True, resume: bool = True) -> None:
+    ap.add_argument("data_dir", nargs="?", default="data_full",
+                    help="Folder holding DN?-rapid / DN?-rate datasets (default: data_full)")
+    if workers:
+        ap.add_argument("--jobs", "-j", type=int, default=1,
+                        help="Worker processes for rasterization (0 = all cores; default: 1)")
+    ap.add_argument("--no-overlays", action="store_true",
+                    help="Skip writing the sample overlays")
+    ap.add_argument("--sample-overlays", type=int, default=12,
+                    help="Cap overlays per dataset (default: 12)")
+    ap.add_argument("--vd-filter", action="store_true",
+                    help="(rapid only) require vd_annotations[key] == True")
+    ap.add_argument("--labels", action="store_true",
+                    help="Write uint16 instance-labelled masks (<stem>_masks.png) instead of binary")
+    ap.add_argument("--mask-format", choices=MASK_WRITERS, default="png",
+                    help="Mask writer backend (default: png)")
+    ap.add_argument("--overlay-format", choices=OVERLAY_WRITERS, default="png",
+                    help="Overlay writer backend (default: png)")
+    ap.add_argument("--overlay-mode", choices=OVERLAY_MODES, default="fill",
+                    help="Overlay style: tint the mask (fill) or outline it (contour) (default: fill)")
+    ap.add_argument("--force", action="store_true",
+                    help="Rewrite every mask/overlay even if its inputs are unchanged")
+    if resume:
+        ap.add_argument("--resume", action="store_true",
+                        help="Skip frames an interrupted run already journaled as written")
+    ap.add_argument("--read-threads", type=int, default=4,
+                    help="Frame-reader threads per worker (default: 4)")
+    ap.add_argument("--write-threads", type=int, default=4,
+                    help="Write-behind threads per worker for PNG encoding (default: 4)")
+    ap.add_argument("--queue-size", type=int, default=16,
+                    help="Max frames in flight per stage, bounds memory (default: 16)")
+
+
+def pipeline_from_args(args: argparse.Namespace) -> MaskPipeline:
+    return MaskPipeline(
+        Path(args.data_dir),
+        jobs=getattr(args, "jobs", 1) or os.cpu_count() or 1,
+        overlays=not args.no_overlays,
+        sample_overlays=args.sample_overlays,
+        use_vd_filter=args.vd_filter,
+        labels=args.labels,
+        mask_format=args.mask_format,
+        overlay_format=args.overlay_format,
+        overlay_mode=args.overlay_mode,
+        force=args.force,
+        resume=getattr(args, "resume", False),
+        io=IOConfig(read_threads=args.read_threads, write_threads=args.write_threads,
+                    read_queue=args.queue_size, write_queue=args.queue_size),
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(prog="afm-cell-training",
+                                 description="AFM cell mask generation pipeline.")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p_masks = sub.add_parser("masks", help="Generate binary masks from annotation JSONs.")
+    add_mask_args(p_masks)
+
+    p_run = sub.add_parser("run", help="One pass per frame: masks, overlays for every frame, stats, export.")
+    add_mask_args(p_run, workers=False, resume=False)   # stats need every frame; resume with `masks`
+    p_run.add_argument("--results", default="results",
+                       help="Folder for mask_summary.csv / frame_stats.csv (default: results)")
+    p_run.add_argument("--export", default=None, metavar="DIR",
+                       help="Also export tif + mask pairs, Cellpose layout, into DIR "
+                            "(the .tif is a byte copy of the source, read again)")
+
+    p_comp = sub.add_parser("compile", help="Compile annotation JSONs into mmap-able columnar stores.")
+    p_comp.add_argument("data_dir", nargs="?", default="data_full")
+    p_comp.add_argument("--jobs", "-j", type=int, default=0, help="Worker processes (0 = all cores; default: 0)")
+
+    p_con = sub.add_parser("consensus", help="Consensus masks + inter-annotator IoU from every annotation file.")
+    p_con.add_argument("data_dir", nargs="?", default="data_full")
+    p_con.add_argument("--method", choices=METHODS, default="majority",
+                       help="Pixel vote across annotators (default: majority)")
+    p_con.add_argument("--absent", choices=ABSENT, default="empty",
+                       help="Annotation files without a manual key on a frame vote an empty mask (empty) "
+                            "or are left out of that frame's vote and IoU (abstain) (default: empty)")
+    p_con.add_argument("--results", default="results",
+                       help="Folder for annotator_agreement.csv (default: results)")
+    p_con.add_argument("--jobs", "-j", type=int, default=0, help="Worker processes (0 = all cores; default: 0)")
+    p_con.add_argument("--format", choices=MASK_WRITERS, default="png",
+                       help="Consensus mask writer backend (default: png)")
+
+    p_gal = sub.add_parser("gallery", help="1/2 + 1/4 overlay thumbnails, contact sheets and an HTML index.")
+    p_gal.add_argument("data_dir", nargs="?", default="data_full")
+    p_gal.add_argument("--jobs", "-j", type=int, default=0, help="Worker processes (0 = all cores; default: 0)")
+    p_gal.add_argument("--format", choices=OVERLAY_WRITERS, default="jpeg",
+                       help="Thumbnail/sheet writer backend (default: jpeg)")
+    p_gal.add_argument("--sheet-by", choices=("cell", "dataset"), default="cell",
+                       help="One contact sheet per cell or per dataset (default: cell)")
+    p_gal.add_argument("--per-sheet", type=int, default=100, help="Tiles per sheet before paging (default: 100)")
+    p_gal.add_argument("--mode", choices=OVERLAY_MODES, default="fill")
+    p_gal.add_argument("--force", action="store_true", help="Redo thumbnails even if newer than their mask")
+
+    p_srv = sub.add_parser("serve", help="Local server rendering masks/overlays/thumbnails on request.")
+    p_srv.add_argument("data_dir", nargs="?", default="data_full")
+    p_srv.add_argument("--host", default="127.0.0.1")
+    p_srv.add_argument("--port", type=int, default=5000)
+    p_srv.add_argument("--cache-mb", type=int, default=512, help="Render cache budget in MB (default: 512)")
+
+    p_cat = sub.add_parser("catalog", help="Refresh the SQLite catalog and query annotation keys.")
+    p_cat.add_argument("data_dir", nargs="?", default="data_full")
+    p_cat.add_argument("--dataset", nargs="+", default=None, help="e.g. DN1-rate DN2-rate")
+    p_cat.add_argument("--kind", choices=("rapid", "rate"), default=None)
+    p_cat.add_argument("--cell", type=int, default=None)
+    p_cat.add_argument("--selection", default=None, help="e.g. manual / exclude")
+
+    p_bench = sub.add_parser("bench-writers", help="Encode ms/frame and bytes/frame per writer backend.")
+    p_bench.add_argument("data_dir", nargs="?", default="data_samples")
+    p_bench.add_argument("--repeat", type=int, default=5)
+
+    args = ap.parse_args(argv)
+    if args.command == "masks":
+        pipeline_from_args(args).run()
+    elif args.command == "run":
+        RunOrchestrator(pipeline_from_args(args), Path(args.results),
+                        Path(args.export) if args.export else None).run()
+    elif args.command == "compile":
+        root = Path(args.data_dir)
+        paths = [p for ds in sorted(d for d in root.iterdir() if d.is_dir() and dataset_kind(d.name))
+                 for p in annotation_files(ds)]
+        t0 = time.perf_counter()
+        stores, timings = open_all(paths, args.jobs or os.cpu_count() or 1)
+        for t in timings:
+            store = stores[t.path]
+            print(f"[compile] {t.path.parent.name}/{t.line()}; vertices={len(store.vertices)}; "
+                  f"dropped_polygons={store.dropped_polygons}")
+        print(f"[compile] {len(paths)} file(s) in {time.perf_counter() - t0:.2f} s")
+    elif args.command == "consensus":
+        ConsensusBuilder(Path(args.data_dir), Path(args.results), args.method,
+                         jobs=args.jobs or os.cpu_count() or 1, fmt=args.format, absent=args.absent).run()
+    elif args.command == "gallery":
+        Gallery(Path(args.data_dir), jobs=args.jobs or os.cpu_count() or 1, fmt=args.format,
+                sheet_by=args.sheet_by, per_sheet=args.per_sheet, mode=args.mode, force=args.force).run()
+    elif args.command == "serve":
+        from .server import serve
+        serve(Path(args.data_dir), args.host, args.port, args.cache_mb << 20)
+    elif args.command == "bench-writers":
+        masks, overlays = load_samples(Path(args.data_dir))
+        print(f"[bench] {len(masks)} frame(s) from {args.data_dir}, repeat={args.repeat}")
+        print_results(bench_writers(masks, overlays, args.repeat))
+    elif args.command == "catalog":
+        with CatalogDB(args.data_dir) as db:
+            print("[catalog] refreshed:", db.refresh())
+            for row in db.annotation_keys(dataset=args.dataset, kind=args.kind,
+                                          cell=args.cell, selection=args.selection):
+                print(f"{row['dataset']}\t{row['key']}\t{row['selection']}")
@@ -0,0 +1,252 @@
+"""
+Consensus masks and inter-annotator agreement from every annotation file of a dataset.
+
+    afm-cell-training consensus data_full --method staple
+
+Mask generation draws from one annotation file per dataset; when there are
+several (one per annotator, a round-2 file, ...) this stage reads them all,
+found the same way as the file mask generation uses (annotations.annotation_files).
+Each file's manual keys are matched to frames with the pipeline's rules (the
+last key wins a frame, within a file).
+
+Who votes on a frame (`absent`):
+    empty      every file; one without a manual key on the frame votes an
+               empty mask (default, so a lone drawing is not a consensus)
+    abstain    only the files with a manual key on the frame
+
+The voters' polygons are rasterized into one (raters, h, w) stack, cropped to
+their joint bounding box, and the stack is reduced in one vectorized pass:
+
+    majority   pixels drawn by more than half of that frame's raters
+    staple     STAPLE-style EM over per-annotator sensitivity / specificity,
+               posterior >= 0.5 (prior: the mean vote inside the crop)
+    IoU        every annotator pair at once, from the stack's Gram matrix
+
+Outputs:
+    <dataset>/consensus/<stem>_mask.png     (binary, the chosen method)
+    <results>/annotator_agreement.csv       one row per frame
+"""
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+import csv
+
+import numpy as np
+
+from .annotation_store import open_all
+from .annotations import annotation_files
+from .catalog_db import dataset_kind
+from .masks import contours_bbox, fill_window, prepare_contours
+from .matching import ImageCatalog
+from .tiff import image_size
+from .utils import ensure_dir
+from .writers import get_writer
+
+METHODS = ("majority", "staple")
+ABSENT = ("empty", "abstain")
+
+
+# -------------- Vectorized reductions ----------------
+def stack_masks(h: int, w: int, polygons_by_rater: list) -> tuple[tuple[int, int, int, int], np.ndarray] | None:
+    """(bbox, (raters, y1-y0, x1-x0) bool stack) over the raters' joint bounding box."""
+    cnts = [prepare_contours(polys) for polys in polygons_by_rater]
+    bbox = contours_bbox([c for cs in cnts for c in cs], h, w)
+    if bbox is None:
+        return None
+    x0, y0, x1, y1 = bbox
+    stack = np.zeros((len(cnts), y1 - y0, x1 - x0), dtype=np.uint8)
+    for layer, cs in zip(stack, cnts):
+        if cs:
+            fill_window(layer, cs, bbox, value=1)
+    return bbox, stack.view(bool)
+
+
+def majority_vote(stack: np.ndarray) -> np.ndarray:
+    return stack.sum(axis=0, dtype=np.int32) * 2 > len(stack)
+
+
+def staple(stack: np.ndarray, iters: int = 50, tol: float = 1e-4, eps: float = 1e-6) -> np.ndarray:
+    """Posterior P(foreground) per pixel from a (raters, ...) bool stack."""
+    d = stack.reshape(len(stack), -1).astype(np.float64)   # (R, N)
+    w = d.mean(axis=0)
+    prior = float(np.clip(w.mean(), eps, 1 - eps))
+    for _ in range(iters):
+        p = np.clip((d @ w) / max(w.sum(), eps), eps, 1 - eps)               # sensitivity
+        q = np.clip(((1 - d) @ (1 - w)) / max((1 - w).sum(), eps), eps, 1 - eps)   # specificity
+        log_fg = np.log(prior) + np.log(p) @ d + np.log1p(-p) @ (1 - d)
+        log_bg = np.log1p(-prior) + np.log(q) @ (1 - d) + np.log1p(-q) @ d
+        w_new = 1.0 / (1.0 + np.exp(np.clip(log_bg - log_fg, -700, 700)))
+        done = np.abs(w_new - w).max() < tol
+        w = w_new
+        if done:
+            break
+    return w.reshape(stack.shape[1:])
+
+
+def pairwise_iou(stack: np.ndarray) -> np.ndarray:
+    """(R, R) IoU of every pair of raters; 1.0 where both are empty."""
+    flat = stack.reshape(len(stack), -1).astype(np.float64)
+    inter = flat @ flat.T
+    area = np.diag(inter)
+    union = area[:, None] + area[None, :] - inter
+    return np.divide(inter, union, out=np.ones_like(inter), where=union > 0)
+
+
+# -------------- Per frame ----------------
+@dataclass
+class FrameAgreement:
+    dataset: str
+    frame: str
+    keys: str            # the key(s) drawn on the frame, "|"-joined if the files disagree
+    annotators: str      # files with a manual key on the frame
+    drawn: int           # how many files that is
+    raters: int          # votes counted: every file, or only `drawn` with absent="abstain"
+    mean_iou: float | None
+    min_iou: float | None
+    consensus_px: int
+    union_px: int
+
+
+def consensus_frame(h: int, w: int, polygons_by_rater: list, method: str) -> tuple[np.ndarray, dict]:
+    """Full-size 0/255 consensus mask and agreement stats for one frame."""
+    mask = np.zeros((h, w), dtype=np.uint8)
+    stats = {"mean_iou": None, "min_iou": None, "consensus_px": 0, "union_px": 0}
+    stacked = stack_masks(h, w, polygons_by_rater)
+    if stacked is None:
+        return mask, stats
+    (x0, y0, x1, y1), stack = stacked
+    agreed = majority_vote(stack) if method == "majority" else staple(stack) >= 0.5
+    mask[y0:y1, x0:x1][agreed] = 255
+    if len(stack) > 1:
+        iou = pairwise_iou(stack)[np.triu_indices(len(stack), k=1)]
+        stats["mean_iou"], stats["min_iou"] = round(float(iou.mean()), 4), round(float(iou.min()), 4)
+    stats["consensus_px"] = int(agreed.sum())
+    stats["union_px"] = int(stack.any(axis=0).sum())
+    return mask, stats
+
+
+def consensus_files(items: list[tuple], method: str, writer_name: str) -> list[dict | None]:
+    """A chunk of (image path, out path, polygons by rater); module-level for the process pool."""
+    writer = get_writer(writer_name, "mask")
+    out = []
+    for img_path, out_path, polygons_by_rater in items:
+        size = image_size(Path(img_path))
+        if size is None:
+            out.append(None)
+            continue
+        mask, stats = consensus_frame(*size, polygons_by_rater, method)
+        out.append(stats if writer.write(Path(out_path), mask) else None)
+    return out
+
+
+# -------------- Stage ----------------
+class ConsensusBuilder:
+    """Consensus masks + per-frame agreement for every rapid/rate dataset under `data_root`.
+
+    method:   "majority" or "staple"
+    absent:   "empty" (files without a manual key on a frame vote empty) or "abstain"
+    jobs:     worker processes (1 = in-process)
+    fmt:      mask writer backend
+    """
+
+    def __init__(self, data_root: Path, results_dir: Path = Path("results"), method: str = "majority",
+                 jobs: int = 1, fmt: str = "png", chunksize: int = 16, absent: str = "empty"):
+        if method not in METHODS:
+            raise ValueError(f"unknown consensus method {method!r}; choose from {', '.join(METHODS)}")
+        if absent not in ABSENT:
+            raise ValueError(f"unknown absent rule {absent!r}; choose from {', '.join(ABSENT)}")
+        self.data_root = Path(data_root)
+        self.results_dir = Path(results_dir)
+        self.method = method
+        self.absent = absent
+        self.jobs = max(1, int(jobs))
+        self.writer = get_writer(fmt, "mask")
+        self.chunksize = chunksize
+        self.rows: list[FrameAgreement] = []
+
+    def plan(self, ds_folder: Path, files: list[Path], pool=None) -> list[tuple[Path, list[int], list[int], list[str], list]]:
+        """[(frame, drawn, raters, keys, polygons by rater), ...] for every frame any file annotates.
+
+        drawn / raters are file indices; polygons are [] for a rater that did not draw.
+        """
+        stores, _ = open_all(files, self.jobs, pool)
+        catalog = ImageCatalog.scan(ds_folder)
+        kind = dataset_kind(ds_folder.name)
+        by_frame: dict[Path, dict[int, int]] = defaultdict(dict)   # frame -> {file index: row}
+        for a, path in enumerate(files):
+            store = stores[path]
+            rows = store.rows("manual")
+            cells, meas = store.cell[rows].tolist(), store.meas[rows].tolist()
+            frames = (catalog.resolve_rate(cells, meas) if kind == "rate"
+                      else [catalog.rapid(c, m) for c, m in zip(cells, meas)])
+            for i, frame in zip(rows.tolist(), frames):
+                if frame is not None:
+                    by_frame[frame][a] = i   # last key on a frame wins, as in 02
+        plan = []
+        for frame in sorted(by_frame):
+            rows = by_frame[frame]
+            drawn = sorted(rows)
+            raters = list(range(len(files))) if self.absent == "empty" else drawn
+            keys = list(dict.fromkeys(stores[files[a]].key(rows[a]) for a in drawn))
+            polys = [stores[files[a]].polygons(rows[a]) if a in rows else [] for a in raters]
+            plan.append((frame, drawn, raters, keys, polys))
+        return plan
+
+    def process(self, ds_folder: Path, pool=None) -> None:
+        files = annotation_files(ds_folder)
+        if not files:
+            print(f"[skip] no annotations for {ds_folder.name}")
+            return
+        plan = self.plan(ds_folder, files, pool)
+        out_dir = ds_folder / "consensus"
+        ensure_dir(out_dir)
+        items = [(str(frame), str(out_dir / f"{frame.stem}_mask{self.writer.ext}"), polys)
+                 for frame, _, _, _, polys in plan]
+        chunks = [items[i:i + self.chunksize] for i in range(0, len(items), self.chunksize)]
+        if pool is not None and len(chunks) > 1:
+            results = pool.map(consensus_files, chunks, [self.method] * len(chunks),
+                               [self.writer.name] * len(chunks))
+        else:
+            results = (consensus_files(c, self.method, self.writer.name) for c in chunks)
+
+        names = [p.name.removesuffix("_im_annotations.json").removesuffix(".json") for p in files]
+        failed, ious = 0, []
+        for (frame, drawn, raters, keys, _), stats in zip(plan, (s for chunk in results for s in chunk)):
+            if stats is None:
+                failed += 1
+                print(f"  [failed] {frame.name}")
+                continue
+            self.rows.append(FrameAgreement(ds_folder.name, frame.stem, "|".join(keys),
+                                            "|".join(names[a] for a in drawn), len(drawn), len(raters),
+                                            **stats))
+            if stats["mean_iou"] is not None:
+                ious.append(stats["mean_iou"])
+        print(f"== {ds_folder.name}: files={len(files)}; frames={len(plan) - failed}; "
+              f"multi_rater={len(ious)}; failed={failed}"
+              + (f"; mean_iou={np.mean(ious):.3f}" if ious else ""))
+
+    def write_results(self) -> Path:
+        ensure_dir(self.results_dir)
+        path = self.results_dir / "annotator_agreement.csv"
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=[fl.name for fl in fields(FrameAgreement)])
+            writer.writeheader()
+            for row in self.rows:
+                writer.writerow(asdict(row))
+        return path
+
+    def run(self) -> list[FrameAgreement]:
+        self.rows = []
+        datasets = sorted(p for p in self.data_root.iterdir() if p.is_dir() and dataset_kind(p.name))
+        pool = ProcessPoolExecutor(max_workers=self.jobs) if self.jobs > 1 else None
+        try:
+            for ds in datasets:
+                self.process(ds, pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        path = self.write_results()
+        print(f"[consensus] {len(self.rows)} frame(s), method={self.method}, absent={self.absent}; agreement in {path}")
+        return self.rows
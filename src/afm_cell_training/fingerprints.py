@@ -0,0 +1,60 @@
+"""
+Input fingerprints for generated outputs, so unchanged masks/overlays are not rewritten.
+
+A fingerprint hashes everything an output depends on: the annotation entry's
+canonical JSON, the source frame's size and mtime, the render settings and
+PIPELINE_VERSION (bump it whenever rasterization or overlay output changes).
+Each dataset keeps the fingerprints of what it last wrote in
+
+    <dataset>/.afm_manifest.json   {"masks/<name>": "<sha1>", "overlays/<name>": ...}
+"""
+
+from pathlib import Path
+import hashlib
+import json
+
+from .utils import atomic_write_bytes, load_json
+
+PIPELINE_VERSION = "2"
+MANIFEST_NAME = ".afm_manifest.json"
+
+
+def entry_digest(entry) -> str:
+    """sha1 of the entry's canonical JSON (sorted keys, no whitespace)."""
+    canon = json.dumps(entry, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canon.encode()).hexdigest()
+
+
+def fingerprint(entry_sha: str, img_path: Path, *settings) -> str:
+    st = img_path.stat()
+    parts = [PIPELINE_VERSION, entry_sha, str(st.st_size), str(st.st_mtime_ns), *map(str, settings)]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+class Manifest:
+    """Fingerprints of the outputs last written for one dataset folder."""
+
+    def __init__(self, ds_folder: Path):
+        self.ds_folder = ds_folder
+        self.path = ds_folder / MANIFEST_NAME
+        self.entries: dict[str, str] = load_json(self.path) or {}
+        self.dirty = False
+
+    def _rel(self, out: Path) -> str:
+        return out.relative_to(self.ds_folder).as_posix()
+
+    def unchanged(self, out: Path, fp: str) -> bool:
+        return self.entries.get(self._rel(out)) == fp and out.exists()
+
+    def record(self, out: Path, fp: str) -> None:
+        self.entries[self._rel(out)] = fp
+        self.dirty = True
+
+    def forget(self, out: Path) -> None:
+        if self.entries.pop(self._rel(out), None) is not None:
+            self.dirty = True
+
+    def save(self) -> None:
+        if self.dirty:
+            atomic_write_bytes(self.path, json.dumps(self.entries, indent=0, sort_keys=True).encode())
+            self.dirty = False
@@ -0,0 +1,89 @@
+"""
+Zero-copy frame access for uncompressed AFM TIFFs.
+
+Our frames are uncompressed, chunky (RGBRGB...), 8-bit strips laid out back to
+back, so the pixel data is one contiguous block at `strip_offsets[0]`.
+`map_frame` memory-maps that block as an (H, W[, C]) array without reading it;
+`read_frame` returns the same views in cv2's conventions (BGR / gray).
+Anything else (compressed, tiled, planar, predictor, >8 bit, non-TIFF) falls
+back to `cv2.imread`.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import cv2
+
+from .tiff import TiffHeader, read_tiff_header
+
+PHOTOMETRIC_GRAY = 1   # BlackIsZero
+PHOTOMETRIC_RGB = 2
+
+# cv2's decoders convert to gray with 14-bit fixed-point BT.601 weights (R, G, B),
+# rounded, not via cvtColor (whose SIMD path is off by one on some pixels).
+# Columns: R, G, B, rounding offset.
+GRAY_SHIFT = 14
+GRAY_TRANSFORM = np.array([[4899, 9617, 1868, 1 << (GRAY_SHIFT - 1)]], dtype=np.float32)
+
+CV2_FLAGS = {
+    "color": cv2.IMREAD_COLOR,
+    "gray": cv2.IMREAD_GRAYSCALE,
+    "unchanged": cv2.IMREAD_UNCHANGED,
+}
+
+
+def is_mappable(hdr: TiffHeader) -> bool:
+    """True if the pixel data is one contiguous, uncompressed, 8-bit chunky block."""
+    if not hdr.uncompressed or hdr.tiled or hdr.planar_config != 1 or hdr.predictor != 1:
+        return False
+    if any(b != 8 for b in hdr.bits_per_sample):
+        return False
+    if (hdr.samples_per_pixel, hdr.photometric) not in ((1, PHOTOMETRIC_GRAY), (3, PHOTOMETRIC_RGB)):
+        return False
+    offs, counts = hdr.strip_offsets, hdr.strip_byte_counts
+    if not offs or len(offs) != len(counts):
+        return False
+    if any(offs[i] + counts[i] != offs[i + 1] for i in range(len(offs) - 1)):
+        return False
+    return sum(counts) >= hdr.width * hdr.height * hdr.samples_per_pixel
+
+
+def map_frame(path: Path, hdr: TiffHeader | None = None) -> np.ndarray | None:
+    """Read-only memmap of the stored samples ((H, W) gray or (H, W, 3) RGB), or None."""
+    hdr = hdr or read_tiff_header(path)
+    if hdr is None or not is_mappable(hdr):
+        return None
+    try:
+        return np.memmap(path, dtype=np.uint8, mode="r",
+                         offset=hdr.strip_offsets[0], shape=hdr.shape)
+    except (OSError, ValueError):
+        return None
+
+
+def rgb_to_gray(arr: np.ndarray) -> np.ndarray:
+    """(H, W, 3) RGB uint8 -> (H, W) gray, exactly as cv2.imread(..., IMREAD_GRAYSCALE) does.
+
+    The weighted sums stay below 2**22, so float32 holds them exactly and the
+    shift reproduces cv2's integer rounding bit for bit.
+    """
+    acc = cv2.transform(arr.astype(np.float32), GRAY_TRANSFORM)
+    return (acc.astype(np.uint32) >> GRAY_SHIFT).astype(np.uint8)
+
+
+def read_frame(path: Path, mode: str = "color") -> np.ndarray | None:
+    """Like cv2.imread(path, IMREAD_COLOR / IMREAD_GRAYSCALE / IMREAD_UNCHANGED).
+
+    For mappable TIFFs "color" is a reversed-channel view of the mapping (BGR,
+    non-contiguous) and "unchanged" is the mapping itself; only "gray" on an RGB
+    frame allocates, converting with cv2's own decode weights (`rgb_to_gray`).
+    """
+    hdr = read_tiff_header(path)
+    arr = map_frame(path, hdr) if hdr is not None else None
+    if arr is None:
+        return cv2.imread(str(path), CV2_FLAGS[mode])
+
+    if mode == "unchanged":
+        return arr if arr.ndim == 2 else arr[..., ::-1]
+    if mode == "gray":
+        return arr if arr.ndim == 2 else rgb_to_gray(arr)
+    return arr[..., ::-1] if arr.ndim == 3 else np.repeat(arr[..., None], 3, axis=2)
@@ -0,0 +1,226 @@
+"""
+Thumbnail pyramid, contact sheets and a static HTML index for QA.
+
+    afm-cell-training gallery data_full
+
+For every mask, the overlay is rendered at 1/2 and 1/4 scale (the frame is
+area-downsampled first, so the blend runs on a quarter of the pixels):
+
+    <dataset>/thumbs/<stem>_2.jpg, <stem>_4.jpg
+
+The 1/4 thumbnails are then tiled into contact sheets, one per cell (or per
+dataset), paged so no sheet gets unwieldy, and indexed by
+
+    <data_root>/gallery/<dataset>[_cellNN][_pK].jpg
+    <data_root>/gallery/index.html     (thumbnails lazy-load, link to the 1/2 scale)
+
+Thumbnails newer than their mask are kept; sheets and the index are rebuilt.
+"""
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import html
+import os
+
+import numpy as np
+import cv2
+
+from .frames import read_frame
+from .matching import STEM_RE
+from .overlay import render_overlay
+from .utils import atomic_write_bytes, ensure_dir
+from .writers import WRITERS, mask_stem, read_mask
+
+THUMB_SCALES = (2, 4)
+TILE_W, TILE_H, LABEL_H = 160, 120, 14
+
+
+def thumbnails(raw: np.ndarray, mask: np.ndarray, **overlay_kw) -> dict[int, np.ndarray]:
+    """{2: half-scale overlay, 4: quarter-scale overlay} from a full-size frame and mask."""
+    h, w = mask.shape[:2]
+    half = (max(1, w // 2), max(1, h // 2))
+    small_raw = cv2.resize(raw, half, interpolation=cv2.INTER_AREA)
+    small_mask = cv2.resize(mask, half, interpolation=cv2.INTER_NEAREST)
+    out = {2: render_overlay(small_raw, small_mask, **overlay_kw)}
+    out[4] = cv2.resize(out[2], (max(1, w // 4), max(1, h // 4)), interpolation=cv2.INTER_AREA)
+    return out
+
+
+def thumb_path(ds_folder: Path, stem: str, scale: int, ext: str) -> Path:
+    return ds_folder / "thumbs" / f"{stem}_{scale}{ext}"
+
+
+# -------------- Thumbnails ----------------
+def thumbnail_file(ds_folder: str, stem: str, mask_path: str, writer_name: str, mode: str = "fill") -> str:
+    """Render both thumbnails of one frame from disk; returns a status for the counters."""
+    writer = WRITERS[writer_name]
+    image_path = os.path.join(ds_folder, f"{stem}.tif")
+    if not os.path.exists(image_path):
+        return "missing_image"
+    raw = read_frame(image_path, "gray")
+    if raw is None:
+        return "bad_image"
+    mask = read_mask(mask_path)
+    if mask is None or mask.shape[:2] != raw.shape[:2]:
+        return "bad_mask"
+    for scale, img in thumbnails(raw, mask, mode=mode).items():
+        if not writer.write(thumb_path(Path(ds_folder), stem, scale, writer.ext), img):
+            return "write_failed"
+    return "ok"
+
+
+def thumbnail_files(items: list[tuple[str, str, str]], writer_name: str, mode: str = "fill") -> list[str]:
+    """A chunk of (dataset folder, stem, mask path); module-level for the process pool."""
+    return [thumbnail_file(*item, writer_name, mode) for item in items]
+
+
+def collect_frames(data_root: Path) -> dict[str, list[tuple[str, Path]]]:
+    """{dataset: [(stem, mask path), ...]} for every dataset folder with masks."""
+    frames = {}
+    for ds in sorted(p for p in Path(data_root).iterdir() if (p / "masks").is_dir()):
+        found = sorted((mask_stem(p.name), p) for p in (ds / "masks").iterdir())
+        found = [(stem, p) for stem, p in found if stem]
+        if found:
+            frames[ds.name] = found
+    return frames
+
+
+# -------------- Contact sheets ----------------
+def contact_sheet(tiles: list[tuple[str, np.ndarray]], cols: int = 10) -> np.ndarray:
+    """Grid of (label, BGR image) tiles, each fitted into TILE_W x TILE_H with a caption."""
+    rows = max(1, -(-len(tiles) // cols))
+    cell_h = TILE_H + LABEL_H
+    sheet = np.full((rows * cell_h, cols * TILE_W, 3), 32, dtype=np.uint8)
+    for i, (label, img) in enumerate(tiles):
+        y, x = (i // cols) * cell_h, (i % cols) * TILE_W
+        h, w = img.shape[:2]
+        s = min(TILE_W / w, TILE_H / h)
+        fit = cv2.resize(img, (max(1, int(w * s)), max(1, int(h * s))), interpolation=cv2.INTER_AREA)
+        if fit.ndim == 2:
+            fit = cv2.cvtColor(fit, cv2.COLOR_GRAY2BGR)
+        sheet[y:y + fit.shape[0], x:x + fit.shape[1]] = fit
+        cv2.putText(sheet, label, (x + 2, y + cell_h - 3), cv2.FONT_HERSHEY_SIMPLEX, 0.35,
+                    (230, 230, 230), 1, cv2.LINE_AA)
+    return sheet
+
+
+def group_key(stem: str, by: str) -> str:
+    m = STEM_RE.search(stem)
+    return f"cell{int(m.group(1)):02d}" if by == "cell" and m else ""
+
+
+def tile_label(stem: str) -> str:
+    m = STEM_RE.search(stem)
+    return f"c{int(m.group(1))} m{int(m.group(2))}" if m else stem[:20]
+
+
+# -------------- Gallery ----------------
+class Gallery:
+    """Thumbnails for every mask under `data_root`, contact sheets and an HTML index.
+
+    jobs:       worker processes for the thumbnails (1 = in-process)
+    fmt:        overlay writer for thumbnails and sheets (jpeg by default)
+    sheet_by:   "cell" (one sheet per cell) or "dataset"
+    per_sheet:  tiles per sheet before paging
+    force:      redo thumbnails even when newer than their mask
+    """
+
+    def __init__(self, data_root: Path, jobs: int = 1, fmt: str = "jpeg", sheet_by: str = "cell",
+                 per_sheet: int = 100, cols: int = 10, mode: str = "fill", force: bool = False,
+                 chunksize: int = 32):
+        self.data_root = Path(data_root)
+        self.jobs = max(1, int(jobs))
+        self.writer = WRITERS[fmt]
+        self.sheet_by = sheet_by
+        self.per_sheet = per_sheet
+        self.cols = cols
+        self.mode = mode
+        self.force = force
+        self.chunksize = chunksize
+        self.out_dir = self.data_root / "gallery"
+
+    def _stale(self, ds_folder: Path, stem: str, mask_path: Path) -> bool:
+        if self.force:
+            return True
+        mtime = mask_path.stat().st_mtime
+        for scale in THUMB_SCALES:
+            t = thumb_path(ds_folder, stem, scale, self.writer.ext)
+            if not t.exists() or t.stat().st_mtime < mtime:
+                return True
+        return False
+
+    def render_thumbnails(self, frames: dict[str, list[tuple[str, Path]]]) -> None:
+        items = []
+        for ds, found in frames.items():
+            ds_folder = self.data_root / ds
+            ensure_dir(ds_folder / "thumbs")
+            items += [(str(ds_folder), stem, str(p)) for stem, p in found if self._stale(ds_folder, stem, p)]
+        chunks = [items[i:i + self.chunksize] for i in range(0, len(items), self.chunksize)]
+        n = len(chunks)
+        if self.jobs > 1 and n > 1:
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                results = list(pool.map(thumbnail_files, chunks, [self.writer.name] * n, [self.mode] * n))
+        else:
+            results = [thumbnail_files(c, self.writer.name, self.mode) for c in chunks]
+        counts = defaultdict(int)
+        for chunk, statuses in zip(chunks, results):
+            for (ds_folder, stem, _), status in zip(chunk, statuses):
+                counts[status] += 1
+                if status != "ok":
+                    print(f"  [{status}] {Path(ds_folder).name}/{stem}")
+        total = sum(len(f) for f in frames.values())
+        print(f"[gallery] thumbnails: rendered={counts.pop('ok', 0)}; up_to_date={total - len(items)}"
+              + "".join(f"; {k}={v}" for k, v in sorted(counts.items())))
+
+    def write_sheets(self, frames: dict[str, list[tuple[str, Path]]]) -> dict[str, list[tuple[str, Path, list[str]]]]:
+        """{dataset: [(group, sheet path, stems), ...]} after writing every contact sheet."""
+        ensure_dir(self.out_dir)
+        sheets = {}
+        for ds, found in frames.items():
+            groups = defaultdict(list)
+            for stem, _ in found:
+                if thumb_path(self.data_root / ds, stem, 4, self.writer.ext).exists():
+                    groups[group_key(stem, self.sheet_by)].append(stem)
+            sheets[ds] = []
+            for group, stems in sorted(groups.items()):
+                pages = [stems[i:i + self.per_sheet] for i in range(0, len(stems), self.per_sheet)]
+                for k, page in enumerate(pages):
+                    name = "_".join(filter(None, (ds, group, f"p{k + 1}" if len(pages) > 1 else "")))
+                    tiles = [(tile_label(s), read_frame(thumb_path(self.data_root / ds, s, 4, self.writer.ext),
+                                                        "color")) for s in page]
+                    tiles = [(label, img) for label, img in tiles if img is not None]
+                    path = self.out_dir / f"{name}{self.writer.ext}"
+                    atomic_write_bytes(path, self.writer.encode(contact_sheet(tiles, self.cols)))
+                    sheets[ds].append((group, path, page))
+        return sheets
+
+    def write_index(self, sheets: dict[str, list[tuple[str, Path, list[str]]]]) -> Path:
+        ext = self.writer.ext
+        parts = ["<!doctype html>", "<meta charset='utf-8'>", "<title>AFM mask QA</title>",
+                 "<style>body{font:13px sans-serif;background:#202020;color:#ddd}"
+                 "img{margin:1px;background:#333;object-fit:contain}a{color:#9cf}figure{display:inline-block;margin:2px}"
+                 "figcaption{font-size:11px}</style>", "<h1>AFM mask QA</h1>"]
+        parts.append("<ul>" + "".join(f"<li><a href='#{html.escape(ds)}'>{html.escape(ds)}</a></li>"
+                                      for ds in sheets) + "</ul>")
+        for ds, entries in sheets.items():
+            parts.append(f"<h2 id='{html.escape(ds)}'>{html.escape(ds)}</h2>")
+            for group, path, stems in entries:
+                parts.append(f"<h3>{html.escape(group or ds)} &middot; <a href='{path.name}'>contact sheet</a>"
+                             f" ({len(stems)})</h3>")
+                for stem in stems:
+                    q = f"../{ds}/thumbs/{stem}_4{ext}"
+                    h = f"../{ds}/thumbs/{stem}_2{ext}"
+                    parts.append(f"<figure><a href='{html.escape(h)}'><img loading='lazy' src='{html.escape(q)}' "
+                                 f"width='{TILE_W}' height='{TILE_H}' alt='{html.escape(stem)}'></a>"
+                                 f"<figcaption>{html.escape(tile_label(stem))}</figcaption></figure>")
+        index = self.out_dir / "index.html"
+        atomic_write_bytes(index, "\n".join(parts).encode())
+        return index
+
+    def run(self) -> Path:
+        frames = collect_frames(self.data_root)
+        self.render_thumbnails(frames)
+        index = self.write_index(self.write_sheets(frames))
+        print(f"[gallery] {sum(len(v) for v in frames.values())} frame(s) -> {index}")
+        return index
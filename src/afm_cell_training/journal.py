@@ -0,0 +1,75 @@
+"""
+Append-only progress journal, so an interrupted mask run can resume.
+
+While a dataset is processed, every completed frame appends one line to
+
+    <dataset>/.afm_journal.jsonl
+        {"key": "('03', '0001')", "outputs": {"masks/<name>": "<fingerprint>", ...}}
+
+and the file is flushed and fsync'ed after every chunk. When the dataset
+finishes, the manifest is saved and the journal removed. If the run dies
+(OOM, preemption, a crash), `--resume` replays the journal and skips every
+output it lists whose fingerprint still matches and whose file exists. Outputs
+are written via temp file + rename, so a journaled file is always complete.
+"""
+
+from pathlib import Path
+import json
+import os
+
+JOURNAL_NAME = ".afm_journal.jsonl"
+
+
+class Journal:
+    def __init__(self, ds_folder: Path, resume: bool = False):
+        self.ds_folder = ds_folder
+        self.path = ds_folder / JOURNAL_NAME
+        self.done: dict[str, str] = {}   # relative output -> fingerprint
+        if resume:
+            self._replay()
+        else:
+            self.path.unlink(missing_ok=True)   # a fresh run starts a fresh journal
+        self._fh = None
+
+    def _rel(self, out: Path) -> str:
+        return out.relative_to(self.ds_folder).as_posix()
+
+    def _replay(self) -> None:
+        try:
+            lines = self.path.read_text().splitlines()
+        except OSError:
+            return
+        for line in lines:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue   # torn last line from a killed run
+            self.done.update(rec.get("outputs", {}))
+
+    def completed(self, out: Path, fp: str) -> bool:
+        return self.done.get(self._rel(out)) == fp and out.exists()
+
+    def append(self, key: str, outputs: dict[Path, str]) -> None:
+        if self._fh is None:
+            self._fh = open(self.path, "a+b")
+            self._fh.seek(0, os.SEEK_END)
+            if self._fh.tell():
+                self._fh.seek(-1, os.SEEK_END)
+                if self._fh.read(1) != b"\n":
+                    self._fh.write(b"\n")   # terminate a torn line before appending
+        rels = {self._rel(out): fp for out, fp in outputs.items()}
+        self._fh.write(json.dumps({"key": key, "outputs": rels}).encode() + b"\n")
+        self.done.update(rels)
+
+    def sync(self) -> None:
+        if self._fh is not None:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def close(self, finished: bool = True) -> None:
+        """Close; once the dataset has `finished` (and the manifest is saved), drop the journal."""
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if finished:
+            self.path.unlink(missing_ok=True)
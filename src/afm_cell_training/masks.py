@@ -0,0 +1,145 @@
+"""
+Polygon rasterization into binary and instance-label masks (overlays: overlay.py).
+
+Polygons are filled only inside their combined bounding box (clipped to the
+frame), so the cost scales with the annotated area rather than the frame.
+`MaskRasterizer` also recycles a ring of full-frame buffers per shape, zeroing
+just the window the previous frame dirtied.
+
+Masks are either binary (uint8, 255 = cell) or instance-labelled (uint16,
+polygon i painted with label i, 1-based, later polygons on top), the form
+Cellpose-style training expects.
+"""
+
+import numpy as np
+import cv2
+
+BBox = tuple[int, int, int, int]   # x0, y0, x1, y1 (exclusive)
+
+
+def prepare_contours(polygons) -> list[np.ndarray]:
+    """clickData polygons ([[x,y], ...] each) -> int32 contours with at least 3 points."""
+    cnts = []
+    for poly in polygons or []:
+        cnt = np.asarray(poly, dtype=np.int32).reshape(-1, 1, 2)
+        if cnt.size >= 6:  # at least 3 points
+            cnts.append(cnt)
+    return cnts
+
+
+def contours_bbox(cnts: list[np.ndarray], h: int, w: int) -> BBox | None:
+    """Bounding box of all contours, clipped to the frame; None if nothing is visible."""
+    if not cnts:
+        return None
+    pts = np.concatenate(cnts).reshape(-1, 2)
+    x0, y0 = np.maximum(pts.min(axis=0), 0)
+    x1, y1 = np.minimum(pts.max(axis=0) + 1, (w, h))
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return int(x0), int(y0), int(x1), int(y1)
+
+
+def _bboxes_disjoint(cnts: list[np.ndarray]) -> bool:
+    if len(cnts) < 2:
+        return True
+    lo = np.array([c.reshape(-1, 2).min(axis=0) for c in cnts])
+    hi = np.array([c.reshape(-1, 2).max(axis=0) for c in cnts])
+    overlap = ((lo[:, None] <= hi[None]) & (lo[None] <= hi[:, None])).all(axis=2)
+    return int(overlap.sum()) == len(cnts)   # only the diagonal
+
+
+def fill_window(win: np.ndarray, cnts: list[np.ndarray], bbox: BBox, value: int = 255,
+                labels: bool = False) -> None:
+    """Fill `cnts` (frame coordinates) into `win`, the frame's `bbox` window.
+
+    A single fillPoly call uses even-odd filling, which would punch holes where
+    polygons overlap, so it is only used when the polygons' boxes are disjoint;
+    otherwise each polygon is filled in turn (the union, as drawContours gives).
+    With `labels`, polygon i is filled with i + 1 instead of `value`.
+    """
+    offset = (-bbox[0], -bbox[1])
+    if labels:
+        for i, cnt in enumerate(cnts, start=1):
+            cv2.fillPoly(win, [cnt], i, offset=offset)
+    elif _bboxes_disjoint(cnts):
+        cv2.fillPoly(win, cnts, value, offset=offset)
+    else:
+        for cnt in cnts:
+            cv2.fillPoly(win, [cnt], value, offset=offset)
+
+
+def mask_dtype(labels: bool):
+    return np.uint16 if labels else np.uint8
+
+
+def rasterize_crop(h: int, w: int, polygons, labels: bool = False) -> tuple[BBox, np.ndarray] | None:
+    """(bbox, crop) of the mask, without materializing the empty background."""
+    cnts = prepare_contours(polygons)
+    bbox = contours_bbox(cnts, h, w)
+    if bbox is None:
+        return None
+    x0, y0, x1, y1 = bbox
+    crop = np.zeros((y1 - y0, x1 - x0), dtype=mask_dtype(labels))
+    fill_window(crop, cnts, bbox, labels=labels)
+    return bbox, crop
+
+
+def rasterize_mask(h: int, w: int, polygons) -> np.ndarray:
+    """polygons is a list of contours; each contour is [[x,y], [x,y], ...]."""
+    mask = np.zeros((h, w), dtype=np.uint8)
+    cnts = prepare_contours(polygons)
+    bbox = contours_bbox(cnts, h, w)
+    if bbox is not None:
+        x0, y0, x1, y1 = bbox
+        fill_window(mask[y0:y1, x0:x1], cnts, bbox)
+    return mask
+
+
+def rasterize_labels(h: int, w: int, polygons) -> np.ndarray:
+    """uint16 instance mask: polygon i (1-based, among valid polygons) painted with i."""
+    mask = np.zeros((h, w), dtype=np.uint16)
+    cnts = prepare_contours(polygons)
+    bbox = contours_bbox(cnts, h, w)
+    if bbox is not None:
+        x0, y0, x1, y1 = bbox
+        fill_window(mask[y0:y1, x0:x1], cnts, bbox, labels=True)
+    return mask
+
+
+class MaskRasterizer:
+    """Bbox-local rasterizer that reuses a ring of `ring` full-frame buffers per shape.
+
+    A returned mask stays valid until `ring` more masks of the same shape have
+    been produced, so size the ring to cover every consumer still holding one
+    (e.g. the write-behind queue). With `labels`, masks are uint16 instance labels.
+    """
+
+    def __init__(self, ring: int = 1, labels: bool = False):
+        self.ring = max(1, ring)
+        self.labels = labels
+        self._slots: dict[tuple[int, int], list[list]] = {}   # shape -> [[buffer, dirty bbox]]
+        self._next: dict[tuple[int, int], int] = {}
+
+    def mask(self, h: int, w: int, polygons) -> np.ndarray:
+        slots = self._slots.setdefault((h, w), [])
+        i = self._next.get((h, w), 0)
+        self._next[h, w] = (i + 1) % self.ring
+        if i == len(slots):
+            slots.append([np.zeros((h, w), dtype=mask_dtype(self.labels)), None])
+        slot = slots[i]
+        buf, dirty = slot
+        if dirty is not None:
+            x0, y0, x1, y1 = dirty
+            buf[y0:y1, x0:x1] = 0
+
+        cnts = prepare_contours(polygons)
+        bbox = contours_bbox(cnts, h, w)
+        if bbox is not None:
+            x0, y0, x1, y1 = bbox
+            fill_window(buf[y0:y1, x0:x1], cnts, bbox, labels=self.labels)
+        slot[1] = bbox
+        return buf
+
+    def crop(self, h: int, w: int, polygons) -> tuple[BBox, np.ndarray] | None:
+        return rasterize_crop(h, w, polygons, labels=self.labels)
+
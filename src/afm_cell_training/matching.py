@@ -0,0 +1,140 @@
+"""
+Match an annotation key (cell, meas) to an image frame on disk.
+
+- RAPID: exact meas -> meas-1 -> lowest meas for that cell
+- RATE:  exact -> meas-1 -> meas-2 -> meas+1 -> nearest for that cell
+
+A dataset folder is scanned once into an `ImageCatalog`; every key is then
+resolved against that in-memory index instead of re-listing the directory.
+`ImageCatalog.resolve_rate` matches a whole dataset's keys in one
+`np.searchsorted` pass over the sorted (cell, meas) codes.
+"""
+
+from bisect import bisect_left
+from pathlib import Path
+import re
+
+import numpy as np
+
+IMG_EXTS = {".tif", ".tiff"}
+STEM_RE = re.compile(r"cell(\d+)meas(\d+)")  # matches "cell03meas0001"
+
+
+def find_images(folder: Path):
+    for p in folder.iterdir():
+        if not p.is_file():
+            continue
+        if p.suffix.lower() not in IMG_EXTS:
+            continue
+        if "overlay" in p.stem.lower():
+            continue
+        yield p
+
+
+def stem_for(cell_str: str, meas_str: str) -> str:
+    return f"cell{int(cell_str):02d}meas{int(meas_str):04d}".lower()
+
+
+class ImageCatalog:
+    """Every frame of one dataset, indexed by (cell, meas).
+
+    by_key:        {(cell, meas): Path}
+    meas_by_cell:  {cell: sorted [meas, ...]}
+    codes / paths: sorted int64 cell<<32|meas codes and the aligned Paths
+    """
+
+    CELL_SHIFT = 32
+
+    def __init__(self, paths):
+        self.by_key: dict[tuple[int, int], Path] = {}
+        for p in paths:
+            m = STEM_RE.match(p.stem.lower())
+            if m:
+                self.by_key[int(m.group(1)), int(m.group(2))] = p
+        per_cell: dict[int, list[int]] = {}
+        for cell, meas in self.by_key:
+            per_cell.setdefault(cell, []).append(meas)
+        self.meas_by_cell = {cell: sorted(ms) for cell, ms in per_cell.items()}
+
+        keys = sorted(self.by_key)
+        self.codes = self.encode([c for c, _ in keys], [m for _, m in keys])
+        self.paths = [self.by_key[k] for k in keys]
+
+    @classmethod
+    def encode(cls, cells, meas) -> np.ndarray:
+        cells = np.asarray(cells, dtype=np.int64)
+        return (cells << cls.CELL_SHIFT) + np.asarray(meas, dtype=np.int64)
+
+    @classmethod
+    def scan(cls, folder: Path) -> "ImageCatalog":
+        """One directory listing per dataset (sorted, so duplicates resolve stably)."""
+        return cls(sorted(find_images(folder)))
+
+    def __len__(self) -> int:
+        return len(self.by_key)
+
+    def get(self, cell: int, meas: int) -> Path | None:
+        return self.by_key.get((cell, meas))
+
+    # ---- Rapid: exact -> meas-1 -> lowest for that cell ----
+    def rapid(self, cell: int, meas: int) -> Path | None:
+        ms = self.meas_by_cell.get(cell)
+        if not ms:
+            return None
+        for m in (meas, meas - 1):    # common 0001 -> 0000
+            if (cell, m) in self.by_key:
+                return self.by_key[cell, m]
+        return self.by_key[cell, ms[0]]
+
+    # ---- Rate: exact -> -1 -> -2 -> +1 -> nearest for that cell ----
+    def rate(self, cell: int, meas: int) -> Path | None:
+        ms = self.meas_by_cell.get(cell)
+        if not ms:
+            return None
+        for delta in (0, -1, -2, +1):
+            if (cell, meas + delta) in self.by_key:
+                return self.by_key[cell, meas + delta]
+        i = bisect_left(ms, meas)
+        if i == len(ms) or (i > 0 and meas - ms[i - 1] <= ms[i] - meas):
+            i -= 1    # ties -> lower meas
+        return self.by_key[cell, ms[i]]
+
+    def resolve_rate(self, cells, meas) -> list[Path | None]:
+        """Vectorized `rate()` for many keys at once (same rules, same answers)."""
+        cells = np.asarray(cells, dtype=np.int64)
+        meas = np.asarray(meas, dtype=np.int64)
+        n = len(self.codes)
+        if n == 0 or cells.size == 0:
+            return [None] * cells.size
+
+        q = self.encode(cells, meas)
+        chosen = np.full(q.shape, -1, dtype=np.int64)
+        for delta in (0, -1, -2, +1):
+            pending = chosen < 0
+            t = q + delta
+            i = np.minimum(np.searchsorted(self.codes, t), n - 1)
+            hit = pending & (self.codes[i] == t)
+            chosen[hit] = i[hit]
+
+        # nearest for that cell: the neighbours either side of the insertion point
+        i = np.searchsorted(self.codes, q)
+        lo = np.maximum(i - 1, 0)
+        hi = np.minimum(i, n - 1)
+        cell_codes = self.codes >> self.CELL_SHIFT
+        lo_ok = (i > 0) & (cell_codes[lo] == cells)
+        hi_ok = (i < n) & (cell_codes[hi] == cells)
+        d_lo = np.abs(q - self.codes[lo])
+        d_hi = np.abs(self.codes[hi] - q)
+        nearest = np.where(lo_ok & (~hi_ok | (d_lo <= d_hi)), lo,
+                           np.where(hi_ok, hi, -1))
+        chosen = np.where(chosen < 0, nearest, chosen)
+
+        return [self.paths[j] if j >= 0 else None for j in chosen.tolist()]
+
+
+def choose_rapid_image(catalog: ImageCatalog, cell_str: str, meas_str: str):
+    return catalog.rapid(int(cell_str), int(meas_str))
+
+
+def choose_rate_image(catalog: ImageCatalog, cell_str: str, meas_str: str):
+    return catalog.rate(int(cell_str), int(meas_str))
@@ -0,0 +1,253 @@
+"""
+Render masks and overlays on demand, straight from the annotation JSON and TIFF.
+
+`FrameSource` resolves (dataset, cell, meas) with the same rules as the mask
+pipeline (rapid: exact -> meas-1 -> lowest; rate: exact -> -1 -> -2 -> +1 ->
+nearest), rasterizes that key's polygons, and keeps decoded frames, masks and
+encoded images in one byte-budgeted LRU. Annotation files are re-read when
+their mtime changes.
+
+Every artefact is keyed by a fingerprint of its inputs (entry digest, frame
+size + mtime, what is rendered), which doubles as an HTTP ETag.
+
+For notebooks and training code:
+
+    from afm_cell_training import get_mask, get_pair
+    mask = get_mask("DN1-rate", 3, 1)                 # uint8 0/255, or None
+    frame, mask = get_pair("DN1-rate", 3, 1, data_root="data_full")
+    set_cache_limit(2 << 30)                          # bytes, shared per data root
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+import threading
+
+import numpy as np
+
+from .annotation_store import AnnotationStore, load_annotations
+from .annotations import find_rapid_annotations, find_rate_annotations
+from .fingerprints import fingerprint
+from .frames import read_frame
+from .masks import rasterize_labels, rasterize_mask
+from .matching import ImageCatalog
+from .tiff import image_size
+
+
+def nbytes_of(value) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(nbytes_of(v) for v in value)
+    return 64
+
+
+class ByteLRU:
+    """Thread-safe LRU bounded by the total size of its values, not their count."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = self.misses = 0
+        self._items: OrderedDict = OrderedDict()   # key -> (value, nbytes)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value) -> None:
+        size = nbytes_of(value)
+        if size > self.max_bytes:
+            return   # would evict everything else for one entry
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._items[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, n) = self._items.popitem(last=False)
+                self.nbytes -= n
+
+    def get_or_put(self, key, make):
+        value = self.get(key)
+        if value is None:
+            value = make()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def resize(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self.nbytes > self.max_bytes:
+                _, (_, n) = self._items.popitem(last=False)
+                self.nbytes -= n
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+@dataclass(frozen=True)
+class FrameRef:
+    """One annotation key resolved to the frame it is drawn on."""
+    dataset: str
+    key: str
+    img_path: Path
+    entry_sha: str
+    polygons: tuple   # (n, 2) int32 vertex arrays, views into the annotation store
+
+
+@dataclass
+class _Dataset:
+    kind: str
+    folder: Path
+    ann_path: Path
+    ann_mtime: int
+    store: AnnotationStore
+    catalog: ImageCatalog
+
+
+class FrameSource:
+    """Lazy (dataset, cell, meas) -> frame / mask / rendered image, memoized within `cache_bytes`."""
+
+    def __init__(self, data_root: Path, cache_bytes: int = 512 << 20):
+        self.data_root = Path(data_root)
+        self.cache = ByteLRU(cache_bytes)
+        self._datasets: dict[str, _Dataset] = {}
+        self._lock = threading.Lock()
+
+    # -------------- Datasets ----------------
+    def datasets(self) -> list[str]:
+        return sorted(p.name for p in self.data_root.iterdir()
+                      if p.is_dir() and p.name.endswith(("-rapid", "-rate")))
+
+    def _dataset(self, name: str) -> _Dataset:
+        folder = self.data_root / name
+        if name.endswith("-rapid"):
+            kind, ann_path = "rapid", find_rapid_annotations(folder, "im")
+        elif name.endswith("-rate"):
+            kind, ann_path = "rate", find_rate_annotations(folder)
+        else:
+            raise KeyError(f"not a rapid/rate dataset: {name}")
+        if not folder.is_dir() or ann_path is None:
+            raise KeyError(f"no annotations for dataset {name}")
+        mtime = ann_path.stat().st_mtime_ns
+        with self._lock:
+            ds = self._datasets.get(name)
+            if ds is None or ds.ann_path != ann_path or ds.ann_mtime != mtime:
+                ds = _Dataset(kind, folder, ann_path, mtime, load_annotations(ann_path),
+                              ImageCatalog.scan(folder))
+                self._datasets[name] = ds
+            return ds
+
+    def resolve(self, dataset: str, cell: int, meas: int) -> FrameRef | None:
+        """The frame a manual (cell, meas) entry is drawn on; None if not manual or unmatched.
+
+        Raises KeyError for an unknown dataset.
+        """
+        ds = self._dataset(dataset)
+        i = ds.store.find(cell, meas)
+        if i is None or ds.store.selection_of(i) != "manual":
+            return None
+        img_path = (ds.catalog.rapid if ds.kind == "rapid" else ds.catalog.rate)(int(cell), int(meas))
+        if img_path is None:
+            return None
+        return FrameRef(dataset, ds.store.key(i), img_path, ds.store.digest_of(i), tuple(ds.store.polygons(i)))
+
+    # -------------- Artefacts ----------------
+    def etag(self, ref: FrameRef, *what) -> str:
+        return fingerprint(ref.entry_sha, ref.img_path, *what)
+
+    def frame(self, ref: FrameRef, mode: str = "color") -> np.ndarray | None:
+        def load():
+            raw = read_frame(ref.img_path, mode)
+            if raw is None:
+                return None
+            raw = np.ascontiguousarray(raw)
+            raw.flags.writeable = False   # shared through the cache
+            return raw
+        # keyed by the frame alone: every key drawn on it shares the decode
+        return self.cache.get_or_put(("frame", fingerprint("", ref.img_path, mode)), load)
+
+    def mask(self, ref: FrameRef, labels: bool = False) -> np.ndarray | None:
+        def render():
+            size = image_size(ref.img_path)   # header only; no pixel decode
+            if size is None:
+                return None
+            m = (rasterize_labels if labels else rasterize_mask)(*size, ref.polygons)
+            m.flags.writeable = False   # shared through the cache
+            return m
+        return self.cache.get_or_put(("mask", self.etag(ref, "mask", labels)), render)
+
+    def rendered(self, tag: str, make) -> bytes | None:
+        """Encoded artefact for an `etag(...)`, built by `make()` on a miss."""
+        return self.cache.get_or_put(("bytes", tag), make)
+
+
+# -------------- Module-level lazy API ----------------
+DEFAULT_CACHE_BYTES = 512 << 20
+_sources: dict[Path, FrameSource] = {}
+_sources_lock = threading.Lock()
+
+
+def get_source(data_root: Path = Path("data_full"), cache_bytes: int | None = None) -> FrameSource:
+    """The shared FrameSource for `data_root` (created on first use)."""
+    root = Path(data_root).resolve()
+    with _sources_lock:
+        src = _sources.get(root)
+        if src is None:
+            src = _sources[root] = FrameSource(root, cache_bytes or DEFAULT_CACHE_BYTES)
+        elif cache_bytes is not None:
+            src.cache.resize(cache_bytes)
+        return src
+
+
+def set_cache_limit(max_bytes: int, data_root: Path | None = None) -> None:
+    """Byte budget for one data root's cache, or for every open one (and new ones) if None."""
+    global DEFAULT_CACHE_BYTES
+    if data_root is not None:
+        get_source(data_root, max_bytes)
+        return
+    DEFAULT_CACHE_BYTES = max_bytes
+    with _sources_lock:
+        for src in _sources.values():
+            src.cache.resize(max_bytes)
+
+
+def get_mask(dataset: str, cell, meas, data_root: Path = Path("data_full"),
+             labels: bool = False) -> np.ndarray | None:
+    """Mask for one manual annotation key, matched to its frame as 02_make_masks would.
+
+    uint8 0/255 (uint16 instance labels with `labels=True`), read-only and
+    memoized; None if the key is not manual or no frame matches. Only the
+    TIFF header is read.
+    """
+    src = get_source(data_root)
+    ref = src.resolve(dataset, int(cell), int(meas))
+    return None if ref is None else src.mask(ref, labels)
+
+
+def get_pair(dataset: str, cell, meas, data_root: Path = Path("data_full"), mode: str = "color",
+             labels: bool = False) -> tuple[np.ndarray, np.ndarray] | None:
+    """(frame, mask) for one manual annotation key; frame as read_frame(`mode`). Both read-only."""
+    src = get_source(data_root)
+    ref = src.resolve(dataset, int(cell), int(meas))
+    if ref is None:
+        return None
+    frame, mask = src.frame(ref, mode), src.mask(ref, labels)
+    return None if frame is None or mask is None else (frame, mask)
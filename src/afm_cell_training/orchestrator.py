@@ -0,0 +1,127 @@
+"""
+One-pass run: masks -> overlays -> stats -> (optional) export, one read per frame.
+
+    afm-cell-training run data_full [--export afm_dataset]
+
+Separately, 02_make_masks reads every frame, 03_overlay_examples reads every
+frame and mask back, 04_summarize_masks re-parses every annotation file and
+10_export_dataset copies the masks again. Here each frame is read once, its
+mask is rasterized and encoded once, and the same in-memory arrays and
+encoded bytes feed the overlay, the per-frame stats and the export folder.
+The one exception is the exported .tif: it is a byte copy of the source file
+(shutil.copy2, no decode), so --export reads each TIFF a second time.
+
+Runs in a single process (reader and writer threads overlap the I/O) and
+always redraws every frame, since the stats cover every frame; for the same
+reason it cannot resume an interrupted run (use `masks --resume` for that).
+A frame that fails to encode, render or write is counted as failed in its
+dataset's report and the run goes on.
+
+Outputs, besides masks/ and overlays/ in each dataset folder:
+    <results>/mask_summary.csv   dataset, masks_written, manual_in_json, exclude_in_json
+    <results>/frame_stats.csv    one row per frame: key, size, polygons, mask pixels
+    <export>/<dataset>_<stem>.tif + <dataset>_<stem>_masks<ext>   (Cellpose layout)
+"""
+
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+import csv
+import shutil
+
+import cv2
+
+from .overlay import render_overlay
+from .pipeline import DatasetReport, FrameJob, MaskPipeline, RenderOptions
+from .utils import atomic_write_bytes, ensure_dir
+from .writers import WRITERS
+
+
+@dataclass
+class FrameStats:
+    dataset: str
+    frame: str
+    key: str
+    height: int
+    width: int
+    polygons: int
+    mask_pixels: int
+
+
+class RunOrchestrator:
+    """Drive a MaskPipeline in-process with a write stage that also renders, measures and exports."""
+
+    def __init__(self, pipeline: MaskPipeline, results_dir: Path = Path("results"),
+                 export_dir: Path | None = None):
+        self.pipeline = pipeline
+        self.results_dir = Path(results_dir)
+        self.export_dir = Path(export_dir) if export_dir else None
+        if pipeline.resume:
+            raise ValueError("run redraws every frame for its stats and cannot resume; use `masks --resume`")
+        pipeline.jobs = 1
+        pipeline.force = True
+        if pipeline.overlays:
+            pipeline.sample_overlays = None
+        pipeline.sink = self.emit
+        self.frames: list[FrameStats] = []
+
+    def emit(self, job: FrameJob, mask, raw, opts: RenderOptions) -> str | None:
+        """Write stage, on a writer thread: encode once, then fan the arrays/bytes out."""
+        try:
+            data = WRITERS[opts.mask_format].encode(mask)
+        except (ValueError, cv2.error) as e:
+            return f"[err] encode failed: {job.mask_path}: {e}"
+        try:
+            if job.write_mask:
+                atomic_write_bytes(job.mask_path, data)
+        except OSError:
+            return f"[err] write failed: {job.mask_path}"
+        if raw is not None:
+            try:
+                overlay = render_overlay(raw, mask, mode=opts.overlay_mode)
+            except (ValueError, cv2.error) as e:
+                return f"[err] overlay failed: {job.overlay_path}: {e}"
+            if not WRITERS[opts.overlay_format].write(job.overlay_path, overlay):
+                return f"[err] write failed: {job.overlay_path}"
+
+        dataset = job.mask_path.parent.parent.name
+        if self.export_dir is not None:
+            try:
+                shutil.copy2(job.img_path, self.export_dir / f"{dataset}_{job.img_path.name}")
+                atomic_write_bytes(self.export_dir / f"{dataset}_{job.img_path.stem}_masks{job.mask_path.suffix}",
+                                   data)
+            except OSError as e:
+                return f"[err] export failed: {job.img_path}: {e}"
+
+        h, w = mask.shape[:2]
+        self.frames.append(FrameStats(dataset, job.img_path.stem, job.key, h, w,
+                                      len(job.polygons), cv2.countNonZero(mask)))
+        return None
+
+    def run(self) -> list[DatasetReport]:
+        if self.export_dir is not None:
+            ensure_dir(self.export_dir)
+        reports = self.pipeline.run()
+        self.write_results(reports)
+        return reports
+
+    def write_results(self, reports: list[DatasetReport]) -> None:
+        ensure_dir(self.results_dir)
+        ext = self.pipeline.mask_ext
+        with open(self.results_dir / "mask_summary.csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["dataset", "masks_written", "manual_in_json", "exclude_in_json"])
+            for r in reports:
+                mask_dir = self.pipeline.data_dir / r.dataset / "masks"
+                written = sum(1 for _ in mask_dir.glob(f"*{ext}"))
+                writer.writerow([r.dataset, written, r.selections["manual"], r.selections["exclude"]])
+
+        with open(self.results_dir / "frame_stats.csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=[fl.name for fl in fields(FrameStats)])
+            writer.writeheader()
+            # a frame drawn again (see MaskPipeline._reconcile) keeps its last stats;
+            # writer threads finish out of order, so sort for a stable file
+            frames = {(st.dataset, st.frame): st for st in self.frames}
+            for _, st in sorted(frames.items()):
+                writer.writerow(asdict(st))
+        print(f"[run] {len(frames)} frame(s); stats in {self.results_dir}"
+              + (f"; exported to {self.export_dir}" if self.export_dir else ""))
@@ -0,0 +1,95 @@
+"""
+Overlay rendering shared by mask generation (02 / `masks`, `run`) and 03_overlay_examples.
+
+Work is confined to the mask's bounding box: the frame is copied once (or
+converted from grayscale once), and the blend is a per-channel 256-entry
+uint8 lookup table built with fixed-point integer arithmetic,
+
+    out = (px * (256 - a) + color * a + 128) >> 8,    a = round(alpha * 256)
+
+applied with cv2.LUT to the bbox crop and copied back where the mask is set.
+No float temporaries, no full-frame blend.
+
+Modes:
+    fill      tint the masked pixels (default)
+    contour   draw only the mask outlines, leaving the frame untouched inside
+"""
+
+from functools import lru_cache
+import os
+
+import numpy as np
+import cv2
+
+from .frames import read_frame
+from .masks import BBox
+from .writers import WRITERS, read_mask
+
+OVERLAY_MODES = ("fill", "contour")
+RED = (0, 0, 255)     # BGR
+
+
+@lru_cache(maxsize=32)
+def blend_lut(color: tuple[int, int, int], alpha: float) -> np.ndarray:
+    """(1, 256, 3) uint8 table: channel value -> value blended toward `color`."""
+    a = int(round(alpha * 256))
+    v = np.arange(256, dtype=np.uint32)[:, None]
+    lut = (v * (256 - a) + np.asarray(color, dtype=np.uint32) * a + 128) >> 8
+    return np.minimum(lut, 255).astype(np.uint8)[None]
+
+
+def mask_bbox(mask: np.ndarray) -> BBox | None:
+    """(x0, y0, x1, y1), exclusive, of the non-zero pixels, or None if there are none."""
+    m8 = mask if mask.dtype == np.uint8 else (mask != 0).view(np.uint8)
+    x, y, w, h = cv2.boundingRect(m8)
+    return None if w == 0 else (x, y, x + w, y + h)
+
+
+def render_overlay(raw: np.ndarray, mask: np.ndarray, color: tuple[int, int, int] = RED,
+                   alpha: float = 0.5, mode: str = "fill", thickness: int = 1,
+                   bbox: BBox | None = None) -> np.ndarray:
+    """Colour BGR overlay of `mask` (binary or instance labels) on a gray or BGR frame.
+
+    `bbox` may be passed when the caller already knows where the mask is set.
+    """
+    if mode not in OVERLAY_MODES:
+        raise ValueError(f"unknown overlay mode {mode!r}; choose from {', '.join(OVERLAY_MODES)}")
+    ov = cv2.cvtColor(raw, cv2.COLOR_GRAY2BGR) if raw.ndim == 2 else raw.copy()
+    if bbox is None:
+        bbox = mask_bbox(mask)
+    if bbox is None:
+        return ov
+    x0, y0, x1, y1 = bbox
+    m = mask[y0:y1, x0:x1] != 0
+    crop = ov[y0:y1, x0:x1]
+    if mode == "fill":
+        np.copyto(crop, cv2.LUT(crop, blend_lut(color, alpha)), where=m[..., None])
+    else:
+        cnts, _ = cv2.findContours(m.view(np.uint8), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        cv2.drawContours(ov, cnts, -1, color, thickness, offset=(x0, y0))
+    return ov
+
+
+# -------------- Batch rendering from files ----------------
+def overlay_file(image_path: str, mask_path: str, overlay_path: str, writer_name: str,
+                 color: tuple[int, int, int] = RED, alpha: float = 0.5, mode: str = "fill") -> str:
+    """Render one overlay from files on disk; returns a status for per-dataset counters."""
+    if not os.path.exists(image_path):
+        return "missing_image"
+    try:
+        image = read_frame(image_path, "gray")
+        if image is None:
+            return "bad_image"
+        mask = read_mask(mask_path)   # keeps 16-bit labels (> 0 = cell)
+        if mask is None:
+            return "bad_mask"
+        overlay = render_overlay(image, mask, color, alpha, mode)
+    except Exception:
+        return "error"
+    return "ok" if WRITERS[writer_name].write(overlay_path, overlay) else "write_failed"
+
+
+def overlay_files(items: list[tuple[str, str, str]], writer_name: str,
+                  color: tuple[int, int, int] = RED, alpha: float = 0.5, mode: str = "fill") -> list[str]:
+    """A chunk of (image, mask, overlay) paths; module-level so it can run on a process pool."""
+    return [overlay_file(*item, writer_name, color, alpha, mode) for item in items]
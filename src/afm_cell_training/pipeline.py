@@ -0,0 +1,653 @@
+"""
+Mask generation for RAPID and RATE datasets.
+
+`MaskPipeline` plans every (annotation key -> image frame) job for a dataset in
+the parent process, then rasterizes and writes the frames on a process pool.
+Planning is serial and ordered, so the files written (and the overlay sample)
+are the same whatever the worker count.
+
+An annotation file over `stream_bytes` with no up-to-date store is planned
+while it is parsed: frames only ever fall back within their key's cell, so each
+cell's frames are drawn as soon as the file moves on to the next cell, and the
+whole-file plan at the end only draws what is left (see `_stream_jobs`).
+
+Inside each worker, frames stream through three overlapped stages: a reader
+thread pool, rasterization, and a write-behind pool for encoding, each with
+a bounded number of frames in flight (see `IOConfig`).
+
+Outputs (inside each dataset folder):
+    masks/<image_stem>_mask.png   (binary, or <image_stem>_masks.png: uint16 instance labels)
+    overlays/<image_stem>_overlay.png (a few samples)
+The file format of each is a writer backend (see writers.py); PNG by default.
+"""
+
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice, repeat
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from .annotation_diff import AnnotationDiff, AnnotationSnapshot, KeyState
+from .annotation_store import STREAM_BYTES, AnnotationStore, load_annotations, open_all
+from .annotations import annotation_files, find_rapid_annotations, find_rate_annotations
+from .fingerprints import Manifest, fingerprint
+from .frames import read_frame
+from .journal import Journal
+from .masks import MaskRasterizer
+from .matching import ImageCatalog
+from .overlay import OVERLAY_MODES, render_overlay
+from .stages import IOConfig, bounded_map
+from .tiff import image_size
+from .utils import ensure_dir, load_json
+from .writers import WRITERS, get_writer
+
+
+@dataclass
+class FrameJob:
+    """One manual annotation entry matched to the frame it will be drawn on."""
+    key: str
+    img_path: Path
+    polygons: list
+    mask_path: Path
+    overlay_path: Path | None = None
+    superseded: int = 0   # earlier keys that resolved to the same frame
+    write_mask: bool = True   # False when only the overlay is out of date
+    mask_fp: str = ""
+    overlay_fp: str = ""
+
+
+@dataclass
+class DatasetReport:
+    dataset: str
+    made: int = 0
+    manual: int = 0
+    skip: int = 0
+    miss: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    resumed: int = 0
+    selections: Counter = field(default_factory=Counter)   # parsed keys per selection value
+    diff: AnnotationDiff | None = None
+    messages: list[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        return (f"== {self.dataset}: wrote={self.made}; manual={self.manual}; "
+                f"skipped_nonmanual={self.skip}; missing_images={self.miss}; "
+                f"unchanged={self.unchanged}; deleted={self.deleted}"
+                + (f"; resumed={self.resumed}" if self.resumed else ""))
+
+
+@dataclass
+class _Streamed:
+    """What was drawn (or found journaled) while an annotation file was still streaming; see `_reconcile`."""
+    store: AnnotationStore | None = None
+    outputs: dict = field(default_factory=dict)   # output path -> fingerprint
+    counted: dict = field(default_factory=dict)   # mask path -> (report counter, keys, frame stem)
+
+    def count(self, job: FrameJob, counter: str) -> None:
+        self.counted[job.mask_path] = (counter, 1 + job.superseded, job.img_path.stem)
+
+    def uncount(self, mask_path: Path, report: DatasetReport) -> None:
+        """Take a streamed frame's keys back out of the report (it is drawn again, or deleted)."""
+        counter, n, _ = self.counted.pop(mask_path, ("", 0, ""))
+        if counter == "made":
+            report.made -= n
+            report.manual -= n
+        elif counter == "resumed":
+            report.resumed -= n
+
+
+def load_frame(job: FrameJob):
+    """Read stage: returns (job, (H, W) or None, raw BGR frame or None)."""
+    # Masks only need H x W: take it from the TIFF header and decode pixels
+    # only for the frames that get an overlay.
+    if job.overlay_path is None:
+        return job, image_size(job.img_path), None
+    raw = read_frame(job.img_path, "color")
+    if raw is None:
+        return job, None, None
+    raw = np.ascontiguousarray(raw)   # fault the mapped pages in here, on the I/O thread
+    return job, raw.shape[:2], raw
+
+
+@dataclass(frozen=True)
+class RenderOptions:
+    """What each frame is rendered to; picklable, shipped to workers with the jobs."""
+    labels: bool = False          # uint16 instance labels instead of 0/255
+    mask_format: str = "png"      # writers.WRITERS name
+    overlay_format: str = "png"
+    overlay_mode: str = "fill"    # overlay.OVERLAY_MODES
+
+
+def write_frame(job: FrameJob, mask, raw, opts: RenderOptions) -> str | None:
+    """Write stage: encode the mask (and overlay, if sampled)."""
+    if job.write_mask and not WRITERS[opts.mask_format].write(job.mask_path, mask):
+        return f"[err] write failed: {job.mask_path}"
+    if raw is not None and not WRITERS[opts.overlay_format].write(job.overlay_path, render_overlay(raw, mask, mode=opts.overlay_mode)):
+        return f"[err] write failed: {job.overlay_path}"
+    return None
+
+
+def render_frames(jobs: list[FrameJob], io: IOConfig, opts: RenderOptions, sink=write_frame) -> list:
+    """Read -> rasterize -> write a batch of frames with the stages overlapped.
+
+    Reads and PNG writes run on bounded thread pools; rasterization runs on the
+    calling thread between them. `sink(job, mask, raw, opts)` is the write
+    stage. Returns its result per job, in order (an error message or None for
+    `write_frame`; an error message for unreadable frames). Module-level so it
+    can be pickled into worker processes.
+    """
+    errors: list = [None] * len(jobs)
+    writes = deque()
+    # A mask buffer is recycled only after every write that could still hold it has settled.
+    rasterizer = MaskRasterizer(ring=io.write_queue + 1, labels=opts.labels)
+
+    def settle(n):
+        while len(writes) > n:
+            i, fut = writes.popleft()
+            errors[i] = fut.result()
+
+    with ThreadPoolExecutor(io.read_threads) as readers, \
+         ThreadPoolExecutor(io.write_threads) as writers:
+        loaded = bounded_map(readers, load_frame, jobs, io.read_queue)
+        for i, (job, size, raw) in enumerate(loaded):   # ordered, so i matches jobs[i]
+            if size is None:
+                errors[i] = f"[err] unreadable: {job.img_path}"
+                continue
+            mask = rasterizer.mask(*size, job.polygons)
+            writes.append((i, writers.submit(sink, job, mask, raw, opts)))
+            settle(io.write_queue)
+        settle(0)
+    return errors
+
+
+class MaskPipeline:
+    """Generate masks for every DN?-rapid / DN?-rate folder under `data_dir`.
+
+    jobs:             worker processes (1 = run in-process)
+    io:               reader/writer threads and queue sizes per worker
+    overlays:         write a small sample of overlays per dataset
+    sample_overlays:  cap overlays per dataset (None = every frame)
+    use_vd_filter:    (rapid only) require vd_annotations[key] == True
+    labels:           write uint16 instance masks (<stem>_masks.png) instead of binary
+    mask_format:      lossless mask writer: png, png-fast, png-1bit, tif, tiff-deflate, npy
+    overlay_format:   overlay writer: png, png-fast, png-palette, jpeg, webp, npy
+    overlay_mode:     fill (tint the mask) or contour (outline only)
+    force:            rewrite outputs even when their input fingerprint is unchanged
+    resume:           skip frames an interrupted run already journaled as written
+    stream_bytes:     annotation files larger than this with no up-to-date store are
+                      planned while they are parsed, so drawing starts with the first
+                      cell (None = always read the whole file first)
+    """
+
+    def __init__(self, data_dir: Path, jobs: int = 1, overlays: bool = True,
+                 sample_overlays: int | None = 12, use_vd_filter: bool = False,
+                 chunksize: int = 32, io: IOConfig | None = None,
+                 labels: bool = False, mask_format: str = "png", overlay_format: str = "png",
+                 overlay_mode: str = "fill", force: bool = False, resume: bool = False,
+                 stream_bytes: int | None = STREAM_BYTES):
+        self.data_dir = Path(data_dir)
+        self.jobs = max(1, int(jobs))
+        self.overlays = overlays
+        self.sample_overlays = sample_overlays
+        self.use_vd_filter = use_vd_filter
+        self.chunksize = chunksize
+        self.io = io or IOConfig()
+        mask_writer = get_writer(mask_format, "mask")
+        self.overlay_writer = get_writer(overlay_format, "overlay")
+        if labels and mask_writer.binary_only:
+            raise ValueError(f"{mask_format} cannot hold instance labels")
+        self.labels = labels
+        self.mask_ext = mask_writer.ext
+        if overlay_mode not in OVERLAY_MODES:
+            raise ValueError(f"unknown overlay mode {overlay_mode!r}")
+        self.render = RenderOptions(labels, mask_format, overlay_format, overlay_mode)
+        # "_masks" is the Cellpose naming 10_export_dataset prefers
+        self.mask_suffix = "_masks" if labels else "_mask"
+        self.force = force
+        self.resume = resume
+        self.stream_bytes = stream_bytes
+        self.sink = write_frame   # write stage, see render_frames
+
+    # -------------- Discovery ----------------
+    def datasets(self):
+        """Yield (kind, folder) for each rapid/rate dataset, in name order."""
+        for sub in sorted(self.data_dir.iterdir()):
+            if not sub.is_dir():
+                continue
+            if sub.name.endswith("-rapid"):
+                yield "rapid", sub
+            elif sub.name.endswith("-rate"):
+                yield "rate", sub
+            # skip DN?-force and *_annotations directories
+
+    @staticmethod
+    def annotation_path(kind: str, folder: Path) -> Path | None:
+        return find_rapid_annotations(folder, "im") if kind == "rapid" else find_rate_annotations(folder)
+
+    # -------------- Planning ----------------
+    def _source(self, kind: str, ds_folder: Path):
+        """(annotation path, resolver for lists of (cell, meas), resolver for one key, vd annotations) or None."""
+        ann_path = self.annotation_path(kind, ds_folder)
+        if not ann_path:
+            return None
+        catalog = ImageCatalog.scan(ds_folder)
+        if kind == "rate":
+            def resolve(keys):
+                return catalog.resolve_rate([c for c, _ in keys], [m for _, m in keys])
+
+            return ann_path, resolve, catalog.rate, None
+
+        vd_ann = None
+        if self.use_vd_filter:
+            vd_path = find_rapid_annotations(ds_folder, "vd")
+            vd_ann = load_json(vd_path) if vd_path else None
+
+        def resolve(keys):
+            return [catalog.rapid(cell, meas) for cell, meas in keys]
+
+        return ann_path, resolve, catalog.rapid, vd_ann
+
+    def plan(self, kind: str, ds_folder: Path, report: DatasetReport, manifest: Manifest | None = None,
+             snapshot: AnnotationSnapshot | None = None) -> list[FrameJob] | None:
+        src = self._source(kind, ds_folder)
+        if src is None:
+            return None
+        ann_path, resolve, _, vd_ann = src
+        return self._plan(ds_folder, load_annotations(ann_path), resolve, report, manifest, snapshot, vd_ann)
+
+    def plan_rapid(self, ds_folder: Path, report: DatasetReport, manifest: Manifest | None = None,
+                   snapshot: AnnotationSnapshot | None = None) -> list[FrameJob] | None:
+        return self.plan("rapid", ds_folder, report, manifest, snapshot)
+
+    def plan_rate(self, img_folder: Path, report: DatasetReport, manifest: Manifest | None = None,
+                  snapshot: AnnotationSnapshot | None = None) -> list[FrameJob] | None:
+        return self.plan("rate", img_folder, report, manifest, snapshot)
+
+    def _mask_out(self, ds_folder: Path, stem: str) -> Path:
+        return ds_folder / "masks" / f"{stem}{self.mask_suffix}{self.mask_ext}"
+
+    def _overlay_out(self, ds_folder: Path, stem: str) -> Path:
+        return ds_folder / "overlays" / f"{stem}_overlay{self.overlay_writer.ext}"
+
+    @staticmethod
+    def _key_state(k: str, sel: str | None, sha: str, vd_ann: dict | None) -> KeyState:
+        if sel != "manual":
+            return KeyState(sha, sel)
+        if vd_ann is not None and not vd_ann.get(k, False):
+            return KeyState(sha, "vd-rejected")
+        return KeyState(sha, "manual")
+
+    def _frame_job(self, k: str, img_path: Path, polygons: list, sha: str, out: Path,
+                   prev: FrameJob | None, manifest: Manifest | None) -> FrameJob:
+        job = FrameJob(k, img_path, polygons, out, superseded=prev.superseded + 1 if prev else 0)
+        if manifest is not None:
+            job.mask_fp = fingerprint(sha, img_path, "mask", self.render.labels, self.render.mask_format)
+            job.overlay_fp = fingerprint(sha, img_path, "overlay", self.render.overlay_format,
+                                         self.render.overlay_mode)
+        return job
+
+    def _todo(self, jobs: list[FrameJob], dirty: set[str],
+              manifest: Manifest | None) -> tuple[list[FrameJob], int]:
+        """The jobs with an output to (re)write, and how many keys' outputs are all up to date."""
+        if manifest is None or self.force:
+            return jobs, 0
+        todo, unchanged = [], 0
+        for job in jobs:
+            if job.img_path.stem in dirty:
+                todo.append(job)
+                continue
+            job.write_mask = not manifest.unchanged(job.mask_path, job.mask_fp)
+            if job.overlay_path is not None and manifest.unchanged(job.overlay_path, job.overlay_fp):
+                job.overlay_path = None
+            if job.write_mask or job.overlay_path is not None:
+                todo.append(job)
+            else:
+                unchanged += 1 + job.superseded
+        return todo, unchanged
+
+    def _plan(self, ds_folder: Path, store: AnnotationStore, resolve, report: DatasetReport,
+              manifest: Manifest | None = None, snapshot: AnnotationSnapshot | None = None,
+              vd_ann: dict | None = None) -> list[FrameJob]:
+        """`resolve` maps a list of (cell, meas) ints to matched frame Paths (or None).
+
+        With a snapshot, the annotations are diffed key by key against the last
+        run: frames touched by added/changed/switched keys are always redrawn,
+        and masks left behind by removed or no-longer-manual keys are deleted.
+        With a manifest, the remaining outputs whose input fingerprint is
+        unchanged are dropped from the plan (unless `force`).
+        """
+        ensure_dir(ds_folder / "masks")
+        ensure_dir(ds_folder / "overlays")
+
+        wanted = []   # (row, key, (cell, meas)) for manual entries, in file order
+        states = {}   # key -> KeyState, for the annotation diff
+        digests = [d.decode() for d in store.digest.tolist()]
+        rows = zip(store.keys.tolist(), store.selection.tolist(), store.cell.tolist(), store.meas.tolist())
+        for i, (k, code, cell, meas) in enumerate(rows):
+            sel = store.selections[code]
+            report.selections[sel] += 1
+            states[k] = self._key_state(k, sel, digests[i], vd_ann)
+            if states[k].selection != "manual":
+                report.skip += 1
+                continue
+            wanted.append((i, k, (cell, meas)))
+
+        # Several keys can fall back onto the same frame; the last one wins, as it
+        # would when writing serially. Deduping here keeps parallel writes race-free.
+        planned: dict[Path, FrameJob] = {}
+        matched = resolve([cm for _, _, cm in wanted])
+        for (i, k, _), img_path in zip(wanted, matched):
+            if not img_path:
+                report.miss += 1
+                report.messages.append(f"  [miss-img] {k}")
+                continue
+            states[k].frame = img_path.stem
+            out = self._mask_out(ds_folder, img_path.stem)
+            planned[out] = self._frame_job(k, img_path, store.polygons(i), digests[i], out,
+                                           planned.pop(out, None), manifest)
+
+        jobs = list(planned.values())
+        if self.overlays:
+            for job in jobs[:self.sample_overlays]:
+                job.overlay_path = self._overlay_out(ds_folder, job.img_path.stem)
+
+        dirty: set[str] = set()   # frame stems that must be redrawn
+        if snapshot is not None:
+            dirty = self._apply_diff(ds_folder, snapshot, states, report, manifest)
+        todo, unchanged = self._todo(jobs, dirty, manifest)
+        report.unchanged += unchanged
+        return todo
+
+    def _apply_diff(self, ds_folder: Path, snapshot: AnnotationSnapshot, states: dict,
+                    report: DatasetReport, manifest: Manifest | None) -> set[str]:
+        """Diff `states` against the snapshot; delete orphaned outputs, return the dirty frame stems.
+
+        Without a previous snapshot every key counts as added, but nothing is
+        forced: the manifest fingerprints decide, as before.
+        """
+        diff = snapshot.diff(states)
+        report.diff = diff
+        prev = snapshot.states
+        current = {st.frame for st in states.values() if st.frame}
+
+        dirty = set()
+        if snapshot.exists:
+            for k in diff.dirty_keys:
+                dirty.add(states[k].frame)
+            for k, st in states.items():
+                old = prev.get(k)
+                if old is not None and old.frame != st.frame:   # matched frame moved
+                    dirty.update((st.frame, old.frame))
+            for k in diff.gone_keys:   # another key may now win the frame it left
+                dirty.add(prev[k].frame)
+            dirty &= current
+
+        orphaned = {prev[k].frame for k in diff.gone_keys if prev[k].frame} - current
+        for stem in sorted(orphaned):
+            self._delete_outputs(ds_folder, stem, report, manifest)
+        snapshot.update(states)
+        return dirty
+
+    def _delete_outputs(self, ds_folder: Path, stem: str, report: DatasetReport,
+                        manifest: Manifest | None) -> None:
+        for out in (self._mask_out(ds_folder, stem), self._overlay_out(ds_folder, stem)):
+            if out.exists():
+                out.unlink()
+                report.deleted += 1
+            if manifest is not None:
+                manifest.forget(out)
+
+    # -------------- Streamed planning ----------------
+    def _streams(self, ann_path: Path) -> bool:
+        """True if `ann_path` is planned while it is parsed (large, and no fresh store to mmap)."""
+        return (self.stream_bytes is not None and ann_path.stat().st_size > self.stream_bytes
+                and not AnnotationStore.is_fresh(ann_path))
+
+    def _stream_jobs(self, ds_folder: Path, ann_path: Path, resolve_one, report: DatasetReport,
+                     manifest: Manifest, snapshot: AnnotationSnapshot, vd_ann: dict | None,
+                     journal: Journal, streamed: _Streamed):
+        """Compile `ann_path` entry by entry, yielding each cell's jobs once the file has moved past it.
+
+        Every fallback in `ImageCatalog` stays within the key's cell, so when the
+        stream leaves a cell no later key can land on its frames: their last key
+        is known and they can be drawn while the rest of the file is read. The
+        jobs are exactly the ones `_plan` would make for that cell, in the same
+        order (so the overlay sample is too). If a cell comes back or a key
+        repeats, that order is broken and everything from there on is left to
+        the final plan. The compiled store lands in `streamed.store`; the
+        snapshot and the manifest are only read here (`_reconcile` settles them).
+        """
+        ensure_dir(ds_folder / "masks")
+        ensure_dir(ds_folder / "overlays")
+        prev = snapshot.states if snapshot.exists else None
+        seen: set[str] = set()
+        closed: set[int] = set()
+        cell = None
+        planned: dict[Path, FrameJob] = {}
+        dirty: set[str] = set()
+        overlays = 0
+        ordered = True
+        entries = AnnotationStore.stream(ann_path)
+        while True:
+            try:
+                row = next(entries)
+            except StopIteration as stop:
+                streamed.store = stop.value
+                return
+            if not ordered:
+                continue
+            if row.cell != cell:
+                if cell is not None:   # the cell is closed: draw its frames
+                    closed.add(cell)
+                    jobs = list(planned.values())
+                    if self.overlays:   # the first sample_overlays jobs of the file, as in _plan
+                        room = len(jobs) if self.sample_overlays is None else max(self.sample_overlays - overlays, 0)
+                        for job in jobs[:room]:
+                            job.overlay_path = self._overlay_out(ds_folder, job.img_path.stem)
+                        overlays += len(jobs)
+                    todo, _ = self._todo(jobs, dirty, manifest)   # counted by the final plan
+                    if self.resume:
+                        todo = self._skip_journaled(todo, journal, report, None, streamed)
+                    yield from todo
+                cell, planned, dirty = row.cell, {}, set()
+                if cell in closed:
+                    ordered = False
+                    continue
+            if row.key in seen:
+                ordered = False
+                continue
+            seen.add(row.key)
+
+            st = self._key_state(row.key, row.selection, row.digest, vd_ann)
+            img_path = resolve_one(row.cell, row.meas) if st.selection == "manual" else None
+            frame = img_path.stem if img_path else None
+            if prev is not None:   # _apply_diff's rules, key by key; a key's frames are all in its cell
+                old = prev.get(row.key)
+                if old is None or old.selection != st.selection or old.sha != st.sha:
+                    dirty.add(frame)
+                if old is not None and old.frame != frame:
+                    dirty.update((frame, old.frame))
+            if not img_path:
+                continue
+            out = self._mask_out(ds_folder, img_path.stem)
+            planned[out] = self._frame_job(row.key, img_path, row.polygons, row.digest, out,
+                                           planned.pop(out, None), manifest)
+
+    def _reconcile(self, ds_folder: Path, jobs: list[FrameJob], streamed: _Streamed,
+                   report: DatasetReport, manifest: Manifest, snapshot: AnnotationSnapshot) -> list[FrameJob]:
+        """Fold the final plan over what was drawn while streaming; returns what is left to do.
+
+        Outputs already written (or found journaled) with the planned
+        fingerprint are only recorded in the manifest. The rest (the last cell,
+        anything after the file's cell order broke, frames a removed key left)
+        is drawn after every streamed chunk has landed, so the last key still
+        wins; a streamed frame drawn again is counted once. A streamed frame the
+        final plan no longer has (a repeated key that is no longer manual) is deleted.
+        """
+        todo = []
+        for job in jobs:
+            if job.write_mask and streamed.outputs.get(job.mask_path) == job.mask_fp:
+                job.write_mask = False
+                manifest.record(job.mask_path, job.mask_fp)
+            if job.overlay_path is not None and streamed.outputs.get(job.overlay_path) == job.overlay_fp:
+                manifest.record(job.overlay_path, job.overlay_fp)
+                job.overlay_path = None
+            if job.write_mask or job.overlay_path is not None:
+                streamed.uncount(job.mask_path, report)
+                todo.append(job)
+        current = {st.frame for st in snapshot.states.values() if st.frame}
+        for out, (_, _, stem) in list(streamed.counted.items()):
+            if stem not in current:
+                streamed.uncount(out, report)
+                self._delete_outputs(ds_folder, stem, report, manifest)
+        return todo
+
+    # -------------- Execution ----------------
+    def _skip_journaled(self, jobs: list[FrameJob], journal: Journal, report: DatasetReport,
+                        manifest: Manifest | None = None,
+                        streamed: _Streamed | None = None) -> list[FrameJob]:
+        """Drop outputs an interrupted run already wrote (same fingerprint, file on disk)."""
+        todo = []
+        for job in jobs:
+            skipped = {}
+            if job.write_mask and journal.completed(job.mask_path, job.mask_fp):
+                job.write_mask = False
+                skipped[job.mask_path] = job.mask_fp
+            if job.overlay_path is not None and journal.completed(job.overlay_path, job.overlay_fp):
+                skipped[job.overlay_path] = job.overlay_fp
+                job.overlay_path = None
+            if manifest is not None:
+                for out, fp in skipped.items():
+                    manifest.record(out, fp)
+            if streamed is not None:
+                streamed.outputs.update(skipped)
+            if job.write_mask or job.overlay_path is not None:
+                todo.append(job)
+            else:
+                report.resumed += 1 + job.superseded
+                if streamed is not None:
+                    streamed.count(job, "resumed")
+        return todo
+
+    def _execute(self, jobs: Iterable[FrameJob], report: DatasetReport, pool,
+                 manifest: Manifest | None = None, journal: Journal | None = None,
+                 streamed: _Streamed | None = None) -> None:
+        # contiguous chunks, so every worker has enough frames to overlap I/O with,
+        # and progress is journaled as each chunk lands. `jobs` may be a generator
+        # (a streamed plan): a pool submits each chunk as it is cut, while the
+        # rest is still being planned; in-process, chunks are cut as they are drawn.
+        sent = deque()
+
+        def chunks():
+            it = iter(jobs)
+            while chunk := list(islice(it, self.chunksize)):
+                sent.append(chunk)
+                yield chunk
+
+        mapper = pool.map if pool else map
+        results = mapper(render_frames, chunks(), repeat(self.io), repeat(self.render), repeat(self.sink))
+        for errs in results:
+            chunk = sent.popleft()
+            for job, err in zip(chunk, errs):
+                if err:
+                    report.miss += 1
+                    report.messages.append(f"  {err}")
+                    continue
+                report.made += 1 + job.superseded
+                report.manual += 1 + job.superseded
+                written = {}
+                if job.write_mask:
+                    written[job.mask_path] = job.mask_fp
+                if job.overlay_path is not None:
+                    written[job.overlay_path] = job.overlay_fp
+                if manifest is not None:
+                    for out, fp in written.items():
+                        manifest.record(out, fp)
+                if journal is not None:
+                    journal.append(job.key, written)
+                if streamed is not None:
+                    streamed.outputs.update(written)
+                    streamed.count(job, "made")
+            if journal is not None:
+                journal.sync()
+        if manifest is not None:
+            manifest.save()
+
+    def process(self, kind: str, ds_folder: Path, pool=None) -> DatasetReport | None:
+        report = DatasetReport(ds_folder.name)
+        src = self._source(kind, ds_folder)
+        if src is None:
+            print(f"[skip] no annotations for {ds_folder.name}")
+            return None
+        ann_path, resolve, resolve_one, vd_ann = src
+        manifest = Manifest(ds_folder)
+        snapshot = AnnotationSnapshot(ds_folder)
+        print(f"\n== {ds_folder.name} ==")
+        extra = len(annotation_files(ds_folder)) - 1
+        if extra > 0:
+            print(f"  [note] {extra} more annotation file(s) not used here; see `afm-cell-training consensus`")
+        journal = Journal(ds_folder, resume=self.resume)
+        try:
+            if self._streams(ann_path):
+                # draw each cell's frames while the rest of the file is parsed,
+                # then plan the whole file and draw whatever is left
+                streamed = _Streamed()
+                self._execute(self._stream_jobs(ds_folder, ann_path, resolve_one, report, manifest,
+                                                snapshot, vd_ann, journal, streamed),
+                              report, pool, None, journal, streamed)
+                jobs = self._plan(ds_folder, streamed.store, resolve, report, manifest, snapshot, vd_ann)
+                jobs = self._reconcile(ds_folder, jobs, streamed, report, manifest, snapshot)
+            else:
+                jobs = self._plan(ds_folder, load_annotations(ann_path), resolve, report, manifest,
+                                  snapshot, vd_ann)
+            if report.diff is not None and snapshot.exists:
+                print(f"  annotation diff: {report.diff.summary()}")
+                for line in report.diff.lines():
+                    print(line)
+            if self.resume:
+                jobs = self._skip_journaled(jobs, journal, report, manifest)
+            self._execute(jobs, report, pool, manifest, journal)
+            snapshot.save()
+        except BaseException:
+            journal.close(finished=False)   # keep it for --resume
+            raise
+        journal.close()
+        for msg in report.messages:
+            print(msg)
+        print(report.summary())
+        return report
+
+    def process_rapid(self, ds_folder: Path, pool=None) -> DatasetReport | None:
+        return self.process("rapid", ds_folder, pool)
+
+    def process_rate(self, img_folder: Path, pool=None) -> DatasetReport | None:
+        return self.process("rate", img_folder, pool)
+
+    def preload_annotations(self, datasets: list[tuple[str, Path]], pool: ProcessPoolExecutor | None = None) -> None:
+        """Compile stale annotation stores in parallel up front, so planning only mmaps."""
+        paths = [p for p in (self.annotation_path(kind, folder) for kind, folder in datasets)
+                 if p and not self._streams(p)]   # streamed files are compiled as they are planned
+        _, timings = open_all(paths, self.jobs, pool)
+        for t in timings:
+            if t.compiled:
+                print(f"[load] {t.line()}")
+
+    def run(self) -> list[DatasetReport]:
+        """Process every dataset, sharing one worker pool across them."""
+        reports = []
+        pool = ProcessPoolExecutor(max_workers=self.jobs) if self.jobs > 1 else None
+        try:
+            datasets = list(self.datasets())
+            self.preload_annotations(datasets, pool)
+            for kind, folder in datasets:
+                report = self.process(kind, folder, pool)
+                if report is not None:
+                    reports.append(report)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return reports
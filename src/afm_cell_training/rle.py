@@ -0,0 +1,198 @@
+"""
+Run-length-encoded binary masks, COCO-compatible.
+
+Counts follow COCO: column-major (Fortran) order, alternating background /
+foreground run lengths, starting with background (possibly 0). A typical
+640x480 frame with a few cells is a few dozen runs instead of 300 KB dense.
+
+Area, bbox, union, intersection and IoU work on the runs directly; `decode()`
+is only needed to get pixels back.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from .masks import BBox, rasterize_crop
+
+
+def _intervals_to_counts(n: int, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Sorted, disjoint foreground [start, end) intervals -> COCO counts (merging touching runs)."""
+    if len(starts):
+        keep = np.ones(len(starts), dtype=bool)
+        keep[1:] = starts[1:] != ends[:-1]        # run i starts where run i-1 ended -> merge
+        starts = starts[keep]
+        ends = ends[np.append(keep[1:], True)]
+    edges = np.empty(2 * len(starts) + 2, dtype=np.int64)
+    edges[0] = 0
+    edges[1:-1:2] = starts
+    edges[2:-1:2] = ends
+    edges[-1] = n
+    counts = np.diff(edges)
+    if len(counts) > 1 and counts[-1] == 0:   # mask ends on a foreground run
+        counts = counts[:-1]
+    return counts.astype(np.uint32)
+
+
+def _segments(a: "RLEMask", b: "RLEMask"):
+    """Elementary segments over both masks' run boundaries, with membership in each."""
+    sa, ea = a.intervals()
+    sb, eb = b.intervals()
+    pts = np.unique(np.concatenate([[0, a.h * a.w], sa, ea, sb, eb]))
+    lo, hi = pts[:-1], pts[1:]
+    in_a = np.searchsorted(sa, lo, side="right") > np.searchsorted(ea, lo, side="right")
+    in_b = np.searchsorted(sb, lo, side="right") > np.searchsorted(eb, lo, side="right")
+    return lo, hi, in_a, in_b
+
+
+@dataclass(frozen=True, eq=False)
+class RLEMask:
+    h: int
+    w: int
+    counts: np.ndarray   # uint32 run lengths, column-major, background first
+
+    # -------------- Construction ----------------
+    @classmethod
+    def encode(cls, mask: np.ndarray) -> "RLEMask":
+        """From a dense (H, W) mask; any non-zero pixel (255, or an instance label) is foreground."""
+        h, w = mask.shape[:2]
+        flat = np.asarray(mask).ravel(order="F") != 0
+        change = np.flatnonzero(np.diff(flat.view(np.int8), prepend=0, append=0))
+        return cls(h, w, _intervals_to_counts(h * w, change[0::2], change[1::2]))
+
+    @classmethod
+    def from_crop(cls, h: int, w: int, bbox: BBox, crop: np.ndarray) -> "RLEMask":
+        """From a (bbox, crop) pair, without materializing the full frame."""
+        x0, y0, _, _ = bbox
+        ch, cw = crop.shape
+        # pad each column with a background pixel above and below, so no run crosses a column
+        padded = np.zeros((ch + 2, cw), dtype=np.int8)
+        padded[1:-1] = crop != 0
+        change = np.flatnonzero(np.diff(padded.ravel(order="F"), prepend=0, append=0))
+        col, row = np.divmod(change, ch + 2)
+        glob = (col + x0) * h + (row - 1 + y0)   # local padded index -> frame index
+        return cls(h, w, _intervals_to_counts(h * w, glob[0::2], glob[1::2]))
+
+    @classmethod
+    def from_polygons(cls, h: int, w: int, polygons) -> "RLEMask":
+        cropped = rasterize_crop(h, w, polygons)
+        if cropped is None:
+            return cls(h, w, np.array([h * w], dtype=np.uint32))
+        return cls.from_crop(h, w, *cropped)
+
+    def decode(self) -> np.ndarray:
+        """Dense uint8 (H, W) mask with 255 foreground."""
+        flat = np.zeros(self.h * self.w, dtype=np.uint8)
+        starts, ends = self.intervals()
+        for s, e in zip(starts.tolist(), ends.tolist()):
+            flat[s:e] = 255
+        return flat.reshape((self.h, self.w), order="F")
+
+    # -------------- Run geometry ----------------
+    def intervals(self) -> tuple[np.ndarray, np.ndarray]:
+        """Foreground runs as [start, end) indices into the column-major frame."""
+        edges = np.cumsum(self.counts, dtype=np.int64)
+        return edges[0::2][:len(edges) // 2], edges[1::2]
+
+    @property
+    def area(self) -> int:
+        return int(self.counts[1::2].sum(dtype=np.int64))
+
+    @property
+    def bbox(self) -> BBox | None:
+        """(x0, y0, x1, y1), exclusive, or None for an empty mask."""
+        starts, ends = self.intervals()
+        if not len(starts):
+            return None
+        last = ends - 1
+        x_s, y_s = np.divmod(starts, self.h)
+        x_e, y_e = np.divmod(last, self.h)
+        multi = x_e > x_s   # a run spanning columns covers row 0 and row h-1
+        y0 = int(np.where(multi, 0, y_s).min())
+        y1 = int(np.where(multi, self.h - 1, y_e).max()) + 1
+        return int(x_s.min()), y0, int(x_e.max()) + 1, y1
+
+    @property
+    def nbytes(self) -> int:
+        return self.counts.nbytes
+
+    # -------------- Set operations ----------------
+    def _combine(self, other: "RLEMask", op) -> "RLEMask":
+        if (self.h, self.w) != (other.h, other.w):
+            raise ValueError(f"shape mismatch: {(self.h, self.w)} vs {(other.h, other.w)}")
+        lo, hi, in_a, in_b = _segments(self, other)
+        keep = op(in_a, in_b)
+        return RLEMask(self.h, self.w, _intervals_to_counts(self.h * self.w, lo[keep], hi[keep]))
+
+    def union(self, other: "RLEMask") -> "RLEMask":
+        return self._combine(other, np.logical_or)
+
+    def intersection(self, other: "RLEMask") -> "RLEMask":
+        return self._combine(other, np.logical_and)
+
+    __or__ = union
+    __and__ = intersection
+
+    def iou(self, other: "RLEMask") -> float:
+        """Intersection over union from run boundaries alone (1.0 for two empty masks)."""
+        if (self.h, self.w) != (other.h, other.w):
+            raise ValueError(f"shape mismatch: {(self.h, self.w)} vs {(other.h, other.w)}")
+        lo, hi, in_a, in_b = _segments(self, other)
+        length = hi - lo
+        union = int(length[in_a | in_b].sum())
+        return 1.0 if union == 0 else int(length[in_a & in_b].sum()) / union
+
+    def __eq__(self, other) -> bool:
+        return (isinstance(other, RLEMask) and (self.h, self.w) == (other.h, other.w)
+                and np.array_equal(self.counts, other.counts))
+
+    # -------------- COCO ----------------
+    def to_coco(self, compressed: bool = False) -> dict:
+        """{"size": [h, w], "counts": [...] or LEB128-style string as pycocotools writes it}."""
+        counts = self.counts.tolist()
+        return {"size": [self.h, self.w], "counts": _coco_string(counts) if compressed else counts}
+
+    @classmethod
+    def from_coco(cls, rle: dict) -> "RLEMask":
+        h, w = rle["size"]
+        counts = rle["counts"]
+        if isinstance(counts, (str, bytes)):
+            counts = _coco_unstring(counts.decode() if isinstance(counts, bytes) else counts)
+        return cls(h, w, np.asarray(counts, dtype=np.uint32))
+
+
+def _coco_string(counts: list[int]) -> str:
+    """pycocotools' rleToString: delta-coded (vs. counts[i-2]) 5-bit groups, offset by '0'."""
+    out = []
+    for i, x in enumerate(counts):
+        if i > 2:
+            x -= counts[i - 2]
+        more = True
+        while more:
+            c = x & 0x1F
+            x >>= 5
+            more = (x != -1) if (c & 0x10) else (x != 0)
+            if more:
+                c |= 0x20
+            out.append(chr(c + 48))
+    return "".join(out)
+
+
+def _coco_unstring(s: str) -> list[int]:
+    counts: list[int] = []
+    p = 0
+    while p < len(s):
+        x = k = 0
+        more = True
+        while more:
+            c = ord(s[p]) - 48
+            x |= (c & 0x1F) << (5 * k)
+            more = bool(c & 0x20)
+            p += 1
+            k += 1
+            if not more and (c & 0x10):
+                x |= -1 << (5 * k)
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+    return counts
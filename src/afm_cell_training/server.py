@@ -0,0 +1,87 @@
+"""
+Local review server: masks, overlays and thumbnails rendered on request.
+
+    afm-cell-training serve data_full --port 5000
+
+    GET /                                      datasets
+    GET /<dataset>/<cell>/<meas>/mask.png      binary mask (labels.png: uint16 instance labels)
+    GET /<dataset>/<cell>/<meas>/overlay.png   50% red overlay (?mode=contour for outlines)
+    GET /<dataset>/<cell>/<meas>/thumb.png     1/4 scale overlay (?scale=2 for 1/2)
+
+Nothing is written to disk. Frames, masks and encoded PNGs share one
+byte-budgeted LRU (see ondemand.FrameSource); responses carry an ETag built
+from the inputs' fingerprint, and a matching If-None-Match gets 304 before
+anything is read or rendered. Needs Flask.
+"""
+
+from pathlib import Path
+
+from .gallery import thumbnails
+from .ondemand import FrameSource
+from .overlay import OVERLAY_MODES, render_overlay
+from .writers import WRITERS
+
+PNG = WRITERS["png"]             # masks: flat images compress to a few kB at about the same speed
+FAST_PNG = WRITERS["png-fast"]   # overlays/thumbnails: stored PNG, ~6x faster to encode
+ARTEFACTS = ("mask", "labels", "overlay", "thumb")
+
+
+def create_app(data_root: Path, cache_bytes: int = 512 << 20, source: FrameSource | None = None):
+    try:
+        from flask import Flask, Response, abort, jsonify, request
+    except ImportError as e:
+        raise RuntimeError("the review server needs Flask (pip install flask)") from e
+
+    src = source or FrameSource(data_root, cache_bytes)
+    app = Flask(__name__)
+
+    def encode(ref, artefact: str, mode: str, scale: int):
+        def make():
+            if artefact in ("mask", "labels"):
+                mask = src.mask(ref, labels=artefact == "labels")
+                return None if mask is None else PNG.encode(mask)
+            raw, mask = src.frame(ref), src.mask(ref)
+            if raw is None or mask is None or raw.shape[:2] != mask.shape[:2]:
+                return None
+            if artefact == "overlay":
+                return FAST_PNG.encode(render_overlay(raw, mask, mode=mode))
+            return FAST_PNG.encode(thumbnails(raw, mask, mode=mode)[scale])
+        return make
+
+    @app.get("/")
+    def index():
+        return jsonify(datasets=src.datasets(), cache_bytes=src.cache.nbytes, cache_items=len(src.cache),
+                       hits=src.cache.hits, misses=src.cache.misses)
+
+    @app.get("/<dataset>/<int:cell>/<int:meas>/<artefact>.png")
+    def artefact_png(dataset: str, cell: int, meas: int, artefact: str):
+        if artefact not in ARTEFACTS:
+            abort(404)
+        mode = request.args.get("mode", "fill")
+        scale = request.args.get("scale", 4, type=int)
+        if mode not in OVERLAY_MODES or scale not in (2, 4):
+            abort(400)
+        try:
+            ref = src.resolve(dataset, cell, meas)
+        except KeyError:
+            abort(404)
+        if ref is None:
+            abort(404, "no manual annotation with a matching frame")
+
+        what = (artefact, mode, scale) if artefact == "thumb" else (artefact, mode)
+        tag = src.etag(ref, *what)
+        if request.if_none_match.contains(tag):
+            return Response(status=304, headers={"ETag": f'"{tag}"'})
+        data = src.rendered(tag, encode(ref, artefact, mode, scale))
+        if data is None:
+            abort(500, f"could not render {ref.img_path.name}")
+        resp = Response(data, mimetype="image/png")
+        resp.set_etag(tag)
+        resp.headers["Cache-Control"] = "no-cache"   # always revalidate; the 304 is cheap
+        return resp
+
+    return app
+
+
+def serve(data_root: Path, host: str = "127.0.0.1", port: int = 5000, cache_bytes: int = 512 << 20) -> None:
+    create_app(data_root, cache_bytes).run(host=host, port=port, threaded=True)
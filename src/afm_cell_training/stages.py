@@ -0,0 +1,37 @@
+"""
+Bounded producer/consumer helpers for overlapping disk I/O with compute.
+
+Each stage is an executor plus a window: at most `window` calls are in flight,
+so a stage that runs ahead of its consumer holds a bounded number of frames in
+memory. Results come back in submission order, which keeps output
+deterministic.
+"""
+
+from collections import deque
+from concurrent.futures import Executor
+from dataclasses import dataclass
+
+
+@dataclass
+class IOConfig:
+    """Per-process stage sizing for mask generation.
+
+    read_threads / write_threads:  threads for frame reads and cv2.imwrite
+    read_queue / write_queue:      max frames in flight in each stage
+    """
+    read_threads: int = 4
+    write_threads: int = 4
+    read_queue: int = 16
+    write_queue: int = 16
+
+
+def bounded_map(pool: Executor, fn, items, window: int):
+    """Ordered, lazy `pool.map` that keeps at most `window` calls in flight."""
+    window = max(1, window)
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
@@ -0,0 +1,158 @@
+"""
+Header-only TIFF probing.
+
+Reads the byte-order mark and the first IFD (plus the small out-of-line tag
+arrays it points to) and nothing else, so a 640x480 RGB frame costs a couple of
+KB of I/O instead of a full ~900 KB decode. Handles classic and BigTIFF in
+either byte order. `image_size` also reads a PNG's size from its IHDR chunk,
+so masks are probed without decoding too.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+import struct
+
+import cv2
+
+# tag ids
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+PHOTOMETRIC = 262
+STRIP_OFFSETS = 273
+SAMPLES_PER_PIXEL = 277
+ROWS_PER_STRIP = 278
+STRIP_BYTE_COUNTS = 279
+PLANAR_CONFIG = 284
+PREDICTOR = 317
+TILE_WIDTH = 322
+
+# field type -> (struct code, size)
+FIELD_TYPES = {1: ("B", 1), 3: ("H", 2), 4: ("I", 4), 16: ("Q", 8)}
+
+COMPRESSION_NONE = 1
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+@dataclass
+class TiffHeader:
+    width: int
+    height: int
+    samples_per_pixel: int = 1
+    bits_per_sample: tuple[int, ...] = (1,)
+    compression: int = COMPRESSION_NONE
+    photometric: int | None = None
+    planar_config: int = 1
+    predictor: int = 1
+    rows_per_strip: int | None = None
+    strip_offsets: tuple[int, ...] = ()
+    strip_byte_counts: tuple[int, ...] = ()
+    byteorder: str = "<"
+    tiled: bool = False
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        """(H, W) or (H, W, C), matching what a decoder would return."""
+        if self.samples_per_pixel == 1:
+            return (self.height, self.width)
+        return (self.height, self.width, self.samples_per_pixel)
+
+    @property
+    def uncompressed(self) -> bool:
+        return self.compression == COMPRESSION_NONE
+
+
+def read_tiff_header(path: Path) -> TiffHeader | None:
+    """Parse the first IFD of `path`; None if it isn't a TIFF we understand."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(16)
+            if head[:2] == b"II":
+                bo = "<"
+            elif head[:2] == b"MM":
+                bo = ">"
+            else:
+                return None
+            magic = struct.unpack(bo + "H", head[2:4])[0]
+            if magic == 42:       # classic
+                ifd_off = struct.unpack(bo + "I", head[4:8])[0]
+                count_fmt, entry_size, inline = "H", 12, 4
+            elif magic == 43:     # BigTIFF
+                ifd_off = struct.unpack(bo + "Q", head[8:16])[0]
+                count_fmt, entry_size, inline = "Q", 20, 8
+            else:
+                return None
+
+            f.seek(ifd_off)
+            n_size = struct.calcsize(count_fmt)
+            (n,) = struct.unpack(bo + count_fmt, f.read(n_size))
+            ifd = f.read(n * entry_size)
+            tags: dict[int, tuple[int, ...]] = {}
+            for i in range(n):
+                e = ifd[i * entry_size:(i + 1) * entry_size]
+                tag, ftype = struct.unpack(bo + "HH", e[:4])
+                if ftype not in FIELD_TYPES:
+                    continue
+                code, size = FIELD_TYPES[ftype]
+                count = struct.unpack(bo + ("I" if inline == 4 else "Q"), e[4:4 + inline])[0]
+                nbytes = count * size
+                if nbytes <= inline:
+                    raw = e[4 + inline:4 + inline + nbytes]
+                else:
+                    off = struct.unpack(bo + ("I" if inline == 4 else "Q"), e[4 + inline:])[0]
+                    f.seek(off)
+                    raw = f.read(nbytes)
+                tags[tag] = struct.unpack(f"{bo}{count}{code}", raw)
+    except (OSError, struct.error):
+        return None
+
+    if IMAGE_WIDTH not in tags or IMAGE_LENGTH not in tags:
+        return None
+
+    def one(tag, default=None):
+        return tags[tag][0] if tag in tags else default
+
+    return TiffHeader(
+        width=one(IMAGE_WIDTH),
+        height=one(IMAGE_LENGTH),
+        samples_per_pixel=one(SAMPLES_PER_PIXEL, 1),
+        bits_per_sample=tags.get(BITS_PER_SAMPLE, (1,)),
+        compression=one(COMPRESSION, COMPRESSION_NONE),
+        photometric=one(PHOTOMETRIC),
+        planar_config=one(PLANAR_CONFIG, 1),
+        predictor=one(PREDICTOR, 1),
+        rows_per_strip=one(ROWS_PER_STRIP),
+        strip_offsets=tags.get(STRIP_OFFSETS, ()),
+        strip_byte_counts=tags.get(STRIP_BYTE_COUNTS, ()),
+        byteorder=bo,
+        tiled=TILE_WIDTH in tags,
+    )
+
+
+def read_png_size(path: Path) -> tuple[int, int] | None:
+    """(H, W) from a PNG's IHDR chunk (the first 24 bytes), or None if it isn't a PNG."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(24)
+    except OSError:
+        return None
+    if len(head) < 24 or not head.startswith(PNG_SIGNATURE) or head[12:16] != b"IHDR":
+        return None
+    w, h = struct.unpack(">II", head[16:24])
+    return h, w
+
+
+def image_size(path: Path) -> tuple[int, int] | None:
+    """(H, W) from the TIFF or PNG header, falling back to a full cv2 decode for anything else."""
+    hdr = read_tiff_header(path)
+    if hdr is not None:
+        return hdr.height, hdr.width
+    size = read_png_size(path)
+    if size is not None:
+        return size
+    raw = cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+    if raw is None:
+        return None
+    return raw.shape[:2]
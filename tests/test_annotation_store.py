@@ -0,0 +1,95 @@
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from afm_cell_training.annotation_store import COLUMNS, STORE_DIR, AnnotationStore
+
+
+def write_annotations(path, n_cells=12, n_meas=12):
+    ann = {f"('{c:02d}', '{m:04d}')": {"selection": "manual" if (c + m) % 3 else "exclude",
+                                       "clickData": [[[c, m], [c + 5, m], [c, m + 5]]]}
+           for c in range(n_cells) for m in range(n_meas)}
+    ann["junk"] = {"selection": "manual"}
+    path.write_text(json.dumps(ann))
+    return ann
+
+
+def assert_same(a: AnnotationStore, b: AnnotationStore):
+    for c in COLUMNS:
+        assert np.array_equal(getattr(a, c), getattr(b, c)), c
+    assert a.selections == b.selections
+
+
+def test_open_roundtrip_and_lookups(tmp_path):
+    path = tmp_path / "x_im_annotations.json"
+    ann = write_annotations(path)
+    built = AnnotationStore.from_dict(path, ann)
+    assert len(built) == len(ann) - 1   # "junk" is not a tuple key
+    AnnotationStore.compile(path)
+    assert AnnotationStore.is_fresh(path)
+    assert_same(AnnotationStore.open(path), built)
+
+    i = built.find(3, 4)
+    assert built.key(i) == "('03', '0004')" and built.key_at(i) == (3, 4)
+    assert built.polygons(i)[0].tolist() == [[3, 4], [8, 4], [3, 9]]
+    assert built.lookup([3, 99, 0], [4, 0, 0]).tolist() == [i, -1, built.find(0, 0)]
+    assert all(built.selection_of(r) == "manual" for r in built.rows("manual"))
+    assert built.cell_rows(2).tolist() == [built.find(2, m) for m in range(12)]
+
+
+def test_stale_store_is_rebuilt(tmp_path):
+    path = tmp_path / "x_im_annotations.json"
+    write_annotations(path)
+    AnnotationStore.open(path)
+    ann = write_annotations(path, n_cells=2)
+    assert not AnnotationStore.is_fresh(path)
+    assert len(AnnotationStore.open(path)) == len(ann) - 1
+
+
+def test_concurrent_compiles_in_one_process(tmp_path):
+    path = tmp_path / "x_im_annotations.json"
+    ann = write_annotations(path)
+    ref = AnnotationStore.from_dict(path, ann)
+    errors, stores = [], []
+
+    def compile_repeatedly():
+        try:
+            for _ in range(5):
+                stores.append(AnnotationStore.compile(path))
+        except Exception as e:   # noqa: BLE001 - surfaced by the assert below
+            errors.append(e)
+
+    threads = [threading.Thread(target=compile_repeatedly) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    for store in stores:
+        assert_same(store, ref)
+    assert_same(AnnotationStore.open(path), ref)
+    assert [p.name for p in (tmp_path / STORE_DIR).iterdir()] == ["x_im_annotations"]   # no temp dirs left
+
+
+@pytest.mark.parametrize("text", ["{not json", "[1, 2]"])
+def test_parse_failures_are_not_persisted(tmp_path, text):
+    path = tmp_path / "x_im_annotations.json"
+    path.write_text(text)
+    assert len(AnnotationStore.compile(path)) == 0
+    assert not AnnotationStore.is_fresh(path)
+
+
+def test_compile_command_finds_the_files_masks_use(tmp_path):
+    from afm_cell_training.cli import main
+
+    (tmp_path / "DN1-rate").mkdir()
+    rate = tmp_path / "DN1-rate_annotations" / "round1.json"   # *.json fallback
+    rate.parent.mkdir()
+    write_annotations(rate, n_cells=2)
+    rapid = tmp_path / "DN1-rapid" / "annotations" / "x_im_annotations.json"
+    rapid.parent.mkdir(parents=True)
+    write_annotations(rapid, n_cells=2)
+    main(["compile", str(tmp_path), "-j", "1"])
+    assert AnnotationStore.is_fresh(rate) and AnnotationStore.is_fresh(rapid)
@@ -0,0 +1,101 @@
+import json
+import random
+
+import pytest
+
+from afm_cell_training import annotation_stream
+from afm_cell_training.annotation_stream import decode_entry, find_entry, iter_annotations, iter_members
+
+
+def make_annotations(seed: int = 0, n: int = 40) -> dict:
+    rng = random.Random(seed)
+    ann = {}
+    for i in range(n):
+        sel = rng.choice(["manual", "exclude", "manual"])
+        polys = [[[rng.randint(0, 640), rng.randint(0, 480)] for _ in range(rng.randint(3, 9))]
+                 for _ in range(rng.randint(0, 3))]
+        entry = {"selection": sel, "clickData": polys}
+        if i % 7 == 0:
+            entry = {"clickData": polys, "note": 'braces } { and "quotes"', "selection": sel}
+        ann[f"('{i // 5 + 1:02d}', '{i % 5:04d}')"] = entry
+    ann["not a key"] = "exclude"
+    ann["empty"] = {}
+    return ann
+
+
+def expected(ann: dict, polygons: str) -> list:
+    out = []
+    for k, v in ann.items():
+        if isinstance(v, dict) and polygons != "all":
+            keep = polygons == "manual" and v.get("selection") == "manual"
+            v = {m: x for m, x in v.items() if m != "clickData" or keep}
+        out.append((k, v))
+    return out
+
+
+DUMPS = {
+    "compact": lambda a: json.dumps(a, separators=(",", ":")),
+    "default": json.dumps,
+    "indent": lambda a: json.dumps(a, indent=2),
+}
+
+
+@pytest.mark.parametrize("style", sorted(DUMPS))
+@pytest.mark.parametrize("polygons", ["all", "manual", "none"])
+@pytest.mark.parametrize("chunk_bytes", [1, 7, 64, 1 << 20])
+def test_stream_matches_json_loads(tmp_path, style, polygons, chunk_bytes):
+    ann = make_annotations()
+    path = tmp_path / "x_im_annotations.json"
+    path.write_text(DUMPS[style](ann))
+    got = list(iter_annotations(path, polygons=polygons, chunk_bytes=chunk_bytes))
+    assert got == expected(json.loads(path.read_text()), polygons)
+
+
+@pytest.mark.parametrize("polygons", ["manual", "none"])
+def test_skipped_clickdata_is_never_decoded(tmp_path, monkeypatch, polygons):
+    ann = make_annotations(seed=1)
+    path = tmp_path / "x_im_annotations.json"
+    path.write_text(json.dumps(ann, indent=2))
+    decoded = []
+    real = annotation_stream.parse_json
+
+    def spy(raw):
+        decoded.append(raw)
+        return real(raw)
+
+    monkeypatch.setattr(annotation_stream, "parse_json", spy)
+    list(iter_annotations(path, polygons=polygons))
+    polygon_payloads = [raw for raw in decoded if raw.lstrip().startswith(b"[")]
+    n_manual = sum(isinstance(v, dict) and v.get("selection") == "manual" and "clickData" in v
+                   for v in ann.values())
+    assert len(polygon_payloads) == (n_manual if polygons == "manual" else 0)
+
+
+def test_member_values_are_stripped():
+    raw = b'{\n  "a" : {"x": 1} ,\n  "b":\t[1, 2]\n}'
+    assert list(iter_members([raw])) == [("a", b'{"x": 1}'), ("b", b"[1, 2]")]
+    assert decode_entry(b'  {"selection": "exclude", "clickData": [[[1, 2]]]}', "manual") == \
+        {"selection": "exclude"}
+
+
+def test_duplicates_kept_in_file_order():
+    assert list(iter_members([b'{"a": 1, "a": 2}'])) == [("a", b"1"), ("a", b"2")]
+
+
+@pytest.mark.parametrize("style", sorted(DUMPS))
+def test_find_entry_returns_the_untouched_entry(tmp_path, style):
+    ann = make_annotations()
+    ann["('09', '0001')"] = {"selection": "auto", "contrast": 1.5, "size": 12, "clickData": [[40, 50]]}
+    path = tmp_path / "a.json"
+    path.write_text(DUMPS[style](ann))
+    for k in ("('09', '0001')", "('01', '0002')", "empty"):
+        assert find_entry(path, k, chunk_bytes=64) == ann[k]
+    assert find_entry(path, "('99', '0000')") is None
+    path.write_text('{"a": {"v": 1}, "b": 2, "a": {"v": 3}}')
+    assert find_entry(path, "a") == json.loads(path.read_text())["a"]   # last wins, as json.load
+
+
+@pytest.mark.parametrize("bad", [b'{"a": 1', b'{"a": 1 "b": 2}', b'{"a": "x'])
+def test_malformed_raises(bad):
+    with pytest.raises(ValueError):
+        list(iter_members([bad[i:i + 2] for i in range(0, len(bad), 2)]))
@@ -0,0 +1,24 @@
+import json
+
+from afm_cell_training.annotations import annotation_files
+from afm_cell_training.catalog_db import CatalogDB
+
+
+def entry(selection="manual"):
+    return {"selection": selection, "clickData": [[[1, 1], [5, 1], [5, 5]]]}
+
+
+def test_catalog_indexes_the_annotation_files_masks_use(tmp_path):
+    ds = tmp_path / "DN1-rate"
+    ds.mkdir()
+    ann_dir = tmp_path / "DN1-rate_annotations"
+    ann_dir.mkdir()
+    (ann_dir / "round1.json").write_text(json.dumps({"('03', '0001')": entry(), "('03', '0002')": entry("exclude")}))
+    (ann_dir / "notes.txt").write_text("not json")
+    assert annotation_files(ds) == [ann_dir / "round1.json"]
+
+    with CatalogDB(tmp_path) as db:
+        assert db.refresh()["annotation_files"] == 1
+        rows = db.annotation_keys(cell=3, kind="rate", selection="manual")
+        assert [(r["cell"], r["meas"]) for r in rows] == [(3, 1)]
+        assert db.refresh()["annotation_files"] == 0   # unchanged files are not re-read
@@ -0,0 +1,61 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from afm_cell_training.consensus import ConsensusBuilder, majority_vote, pairwise_iou, staple
+
+H, W = 40, 60
+
+
+def test_majority_and_iou_on_a_stack():
+    stack = np.zeros((3, 4, 4), bool)
+    stack[0, :2] = stack[1, :3] = stack[2, :1] = True   # rows covered: 2, 3, 1
+    assert majority_vote(stack)[:, 0].tolist() == [True, True, False, False]
+    iou = pairwise_iou(stack)
+    assert np.allclose(iou, [[1, 2 / 3, 1 / 2], [2 / 3, 1, 1 / 3], [1 / 2, 1 / 3, 1]])
+    assert pairwise_iou(np.zeros((2, 3, 3), bool)).tolist() == [[1, 1], [1, 1]]
+
+
+def test_staple_agrees_with_unanimous_raters():
+    stack = np.zeros((3, 10, 10), bool)
+    stack[:, 2:6, 3:8] = True
+    assert np.array_equal(staple(stack) >= 0.5, stack[0])
+
+
+def write_rate_dataset(root, files: dict[str, dict]):
+    ds = root / "DN1-rate"
+    ds.mkdir()
+    for m in range(3):
+        cv2.imwrite(str(ds / f"cell01meas{m:04d}.tif"), np.zeros((H, W), np.uint8))
+    ann_dir = root / "DN1-rate_annotations"
+    ann_dir.mkdir()
+    for name, ann in files.items():
+        (ann_dir / name).write_text(json.dumps(ann))
+    return ds
+
+
+def entry(x0, selection="manual"):
+    return {"selection": selection, "clickData": [[[x0, 5], [x0 + 20, 5], [x0 + 20, 25], [x0, 25]]]}
+
+
+@pytest.mark.parametrize("names", [("a_im_annotations.json", "b_im_annotations.json"), ("a.json", "b.json")])
+@pytest.mark.parametrize("absent, raters, consensus_px", [("empty", 2, 0), ("abstain", 1, 21 * 21)])
+def test_annotators_without_a_key_vote_empty_or_abstain(tmp_path, names, absent, raters, consensus_px):
+    a = {"('01', '0000')": entry(5), "('01', '0002')": entry(5)}
+    b = {"('01', '0000')": entry(5), "('01', '0002')": entry(30, "exclude")}
+    ds = write_rate_dataset(tmp_path, dict(zip(names, (a, b))))
+    rows = {r.frame: r for r in ConsensusBuilder(tmp_path, tmp_path / "results", absent=absent).run()}
+
+    both, one = rows["cell01meas0000"], rows["cell01meas0002"]
+    assert (both.drawn, both.raters, both.mean_iou, both.consensus_px) == (2, 2, 1.0, 21 * 21)
+    assert (one.annotators, one.drawn, one.raters, one.consensus_px) == ("a", 1, raters, consensus_px)
+    assert one.mean_iou == (0.0 if absent == "empty" else None)
+    assert (ds / "consensus" / "cell01meas0002_mask.png").exists()
+    assert (tmp_path / "results" / "annotator_agreement.csv").exists()
+
+
+def test_unknown_absent_rule_raises(tmp_path):
+    with pytest.raises(ValueError):
+        ConsensusBuilder(tmp_path, absent="ignore")
@@ -0,0 +1,30 @@
+import cv2
+import numpy as np
+import pytest
+
+from afm_cell_training.frames import map_frame, read_frame
+
+MODES = {"color": cv2.IMREAD_COLOR, "gray": cv2.IMREAD_GRAYSCALE, "unchanged": cv2.IMREAD_UNCHANGED}
+
+
+@pytest.fixture(params=["rgb", "gray"])
+def frame_path(request, tmp_path):
+    rng = np.random.default_rng(0)
+    shape = (48, 64, 3) if request.param == "rgb" else (48, 64)
+    path = tmp_path / "cell01meas0000.tif"
+    cv2.imwrite(str(path), rng.integers(0, 256, shape, np.uint8), [cv2.IMWRITE_TIFF_COMPRESSION, 1])
+    return path
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_mapped_frames_match_cv2_exactly(frame_path, mode):
+    assert map_frame(frame_path) is not None
+    assert np.array_equal(read_frame(frame_path, mode), cv2.imread(str(frame_path), MODES[mode]))
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_compressed_frames_fall_back_to_cv2(tmp_path, mode):
+    path = tmp_path / "x.tif"
+    cv2.imwrite(str(path), np.random.default_rng(1).integers(0, 256, (20, 30, 3), np.uint8))   # LZW
+    assert map_frame(path) is None
+    assert np.array_equal(read_frame(path, mode), cv2.imread(str(path), MODES[mode]))
@@ -0,0 +1,188 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from afm_cell_training.annotation_diff import SNAPSHOT_NAME, KeyState, diff_states
+from afm_cell_training.annotation_store import AnnotationStore
+from afm_cell_training.journal import JOURNAL_NAME, Journal
+from afm_cell_training.pipeline import MaskPipeline, write_frame
+
+H, W = 48, 64
+
+
+def key(cell, meas):
+    return f"('{cell:02d}', '{meas:04d}')"
+
+
+def square(x, y, r=6):
+    return [[x - r, y - r], [x + r, y - r], [x + r, y + r], [x - r, y + r]]
+
+
+def make_dataset(root, n_cells=3, n_meas=4):
+    """DN1-rapid with one frame per key; every key manual, one square each."""
+    ds = root / "DN1-rapid"
+    ds.mkdir(parents=True)
+    ann = {}
+    for c in range(1, n_cells + 1):
+        for m in range(n_meas):
+            cv2.imwrite(str(ds / f"cell{c:02d}meas{m:04d}.tif"), np.full((H, W), 40 * c + m, np.uint8))
+            ann[key(c, m)] = {"selection": "manual", "clickData": [square(10 + 10 * m, 10 + 8 * c)]}
+    save(ds, ann)
+    return ds, ann
+
+
+def save(ds, ann):
+    (ds / f"{ds.name}_im_annotations.json").write_text(json.dumps(ann))
+
+
+def run(root, **kw):
+    (report,) = MaskPipeline(root, overlays=False, chunksize=2, **kw).run()
+    return report
+
+
+def masks(ds):
+    return {p.name: p.read_bytes() for p in sorted((ds / "masks").iterdir())}
+
+
+# -------------- Diff ----------------
+def test_diff_states_classifies_keys():
+    prev = {"a": KeyState("1", "manual", "f1"), "b": KeyState("2", "manual", "f2"),
+            "c": KeyState("3", "manual", "f3"), "d": KeyState("4", "exclude")}
+    cur = {"a": KeyState("1", "manual", "f1"), "b": KeyState("9", "manual", "f2"),
+           "d": KeyState("4", "manual", "f4"), "e": KeyState("5", "manual", "f5")}
+    diff = diff_states(prev, cur)
+    assert (diff.added, diff.changed, diff.removed, diff.unchanged) == (["e"], ["b"], ["c"], 1)
+    assert diff.switched == [("d", "exclude", "manual")]
+    assert diff.dirty_keys == {"b", "d", "e"}
+    assert diff.gone_keys == {"c"}
+
+
+# -------------- Incremental runs ----------------
+@pytest.mark.parametrize("stream_bytes", [None, 0])
+def test_rerun_without_changes_writes_nothing(tmp_path, stream_bytes):
+    ds, ann = make_dataset(tmp_path)
+    first = run(tmp_path, stream_bytes=stream_bytes)
+    assert first.made == len(ann) and (ds / SNAPSHOT_NAME).exists()
+    before = masks(ds)
+    again = run(tmp_path, stream_bytes=stream_bytes)
+    assert (again.made, again.unchanged, again.deleted) == (0, len(ann), 0)
+    assert masks(ds) == before
+
+
+@pytest.mark.parametrize("stream_bytes", [None, 0])
+def test_changed_key_redraws_only_its_frame(tmp_path, stream_bytes):
+    ds, ann = make_dataset(tmp_path)
+    run(tmp_path, stream_bytes=stream_bytes)
+    before = masks(ds)
+    ann[key(2, 1)]["clickData"] = [square(30, 30, 10)]
+    save(ds, ann)
+    report = run(tmp_path, stream_bytes=stream_bytes)
+    assert report.made == 1 and report.diff.changed == [key(2, 1)]
+    after = masks(ds)
+    assert {n for n in after if after[n] != before[n]} == {"cell02meas0001_mask.png"}
+
+
+@pytest.mark.parametrize("stream_bytes", [None, 0])
+def test_switched_and_removed_keys_delete_their_masks(tmp_path, stream_bytes):
+    ds, ann = make_dataset(tmp_path)
+    run(tmp_path, stream_bytes=stream_bytes)
+    ann[key(1, 2)]["selection"] = "exclude"
+    del ann[key(3, 3)]
+    save(ds, ann)
+    report = run(tmp_path, stream_bytes=stream_bytes)
+    assert (report.made, report.deleted) == (0, 2)
+    assert not (ds / "masks" / "cell01meas0002_mask.png").exists()
+    assert not (ds / "masks" / "cell03meas0003_mask.png").exists()
+    assert len(masks(ds)) == len(ann) - 1
+
+
+def test_force_rewrites_everything(tmp_path):
+    _, ann = make_dataset(tmp_path)
+    run(tmp_path)
+    assert run(tmp_path, force=True).made == len(ann)
+
+
+# -------------- Streamed planning ----------------
+def test_streaming_draws_before_the_file_is_read(tmp_path):
+    ds, ann = make_dataset(tmp_path)
+    ann_path = ds / f"{ds.name}_im_annotations.json"
+    store_ready = []
+
+    def sink(job, mask, raw, opts):
+        store_ready.append(AnnotationStore.is_fresh(ann_path))
+        return write_frame(job, mask, raw, opts)
+
+    pipeline = MaskPipeline(tmp_path, overlays=False, chunksize=2, stream_bytes=0)
+    pipeline.sink = sink
+    (report,) = pipeline.run()
+    assert report.made == len(ann) and len(store_ready) == len(ann)
+    assert not store_ready[0] and store_ready[-1]   # the last cell is drawn from the final plan
+
+    clean = tmp_path / "clean"
+    make_dataset(clean)
+    run(clean)
+    assert masks(ds) == masks(clean / "DN1-rapid")
+
+
+def test_streaming_keeps_last_key_when_a_cell_returns(tmp_path):
+    ds, ann = make_dataset(tmp_path)
+    ann[key(1, 4)] = {"selection": "manual", "clickData": [square(40, 30, 12)]}   # no frame 0004: falls back onto 0003
+    save(ds, ann)
+    clean = tmp_path / "clean"
+    make_dataset(clean)
+    save(clean / "DN1-rapid", ann)
+
+    report = run(tmp_path, stream_bytes=0)
+    assert (report.made, report.manual) == (run(clean).made, len(ann))
+    assert masks(ds) == masks(clean / "DN1-rapid")
+    assert run(tmp_path, stream_bytes=0).made == 0
+
+
+# -------------- Resume ----------------
+def test_resume_skips_journaled_frames(tmp_path):
+    ds, ann = make_dataset(tmp_path)
+    calls = []
+
+    def dies_after_first_chunk(job, mask, raw, opts):
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        calls.append(job.key)
+        return write_frame(job, mask, raw, opts)
+
+    pipeline = MaskPipeline(tmp_path, overlays=False, chunksize=2)
+    pipeline.sink = dies_after_first_chunk
+    with pytest.raises(KeyboardInterrupt):
+        pipeline.run()
+    journal = Journal(ds, resume=True)
+    assert len(journal.done) == 2 and (ds / JOURNAL_NAME).exists()
+
+    report = run(tmp_path, resume=True)
+    assert (report.resumed, report.made) == (2, len(ann) - 2)
+    assert not (ds / JOURNAL_NAME).exists()
+    resumed = masks(ds)
+
+    clean = tmp_path / "clean"
+    make_dataset(clean)
+    run(clean)
+    assert resumed == masks(clean / "DN1-rapid")
+
+
+def test_journal_ignores_torn_line_and_missing_files(tmp_path):
+    out = tmp_path / "masks" / "a_mask.png"
+    out.parent.mkdir()
+    out.write_bytes(b"x")
+    journal = Journal(tmp_path)
+    journal.append(key(1, 0), {out: "fp1", tmp_path / "masks" / "gone.png": "fp2"})
+    journal.close(finished=False)
+    with open(tmp_path / JOURNAL_NAME, "ab") as f:
+        f.write(b'{"key": "torn", "outp')
+
+    replayed = Journal(tmp_path, resume=True)
+    assert replayed.completed(out, "fp1")
+    assert not replayed.completed(out, "other")
+    assert not replayed.completed(tmp_path / "masks" / "gone.png", "fp2")
+    replayed.append(key(1, 1), {out: "fp3"})
+    replayed.close(finished=False)
+    assert Journal(tmp_path, resume=True).completed(out, "fp3")
@@ -0,0 +1,79 @@
+import random
+import re
+from pathlib import Path
+
+import pytest
+
+from afm_cell_training.matching import ImageCatalog, choose_rapid_image, choose_rate_image, stem_for
+
+
+# -------------- The original 02_make_masks.py choosers, over a {stem: Path} index ----------------
+def baseline_rapid(idx: dict, cell_str: str, meas_str: str):
+    prefix = f"cell{int(cell_str):02d}meas"
+    by_meas = {int(re.search(r"meas(\d+)", s).group(1)): p for s, p in idx.items() if s.startswith(prefix)}
+    if not by_meas:
+        return None
+    annot_meas = int(meas_str)
+    if annot_meas in by_meas:
+        return by_meas[annot_meas]
+    if (annot_meas - 1) in by_meas:
+        return by_meas[annot_meas - 1]
+    return by_meas[min(by_meas.keys())]
+
+
+def baseline_rate(stem: str, idx: dict):
+    if stem in idx:
+        return idx[stem]
+    m = re.search(r"cell(\d+)meas(\d+)", stem)
+    if not m:
+        return None
+    cell, meas = int(m.group(1)), int(m.group(2))
+    for delta in (-1, -2, +1):
+        s2 = f"cell{cell:02d}meas{meas+delta:04d}"
+        if s2 in idx:
+            return idx[s2]
+    per_cell = sorted((int(re.search(r"meas(\d+)", k).group(1)), k)
+                      for k in idx.keys() if k.startswith(f"cell{cell:02d}meas"))
+    if per_cell:
+        return idx[min(per_cell, key=lambda t: abs(t[0] - meas))[1]]
+    return None
+
+
+def random_frames(seed: int) -> list[Path]:
+    rng = random.Random(seed)
+    return [Path(f"cell{c:02d}meas{m:04d}.tif")
+            for c in range(1, 6) if rng.random() < 0.8
+            for m in sorted(rng.sample(range(40), rng.randint(1, 8)))]
+
+
+CATALOGS = {
+    "empty": [],
+    "one": [Path("cell01meas0005.tif")],
+    "tie": [Path("cell01meas0002.tif"), Path("cell01meas0008.tif")],   # meas 5 is 3 from both
+    **{f"random{s}": random_frames(s) for s in range(8)},
+}
+QUERIES = [(c, m) for c in range(0, 7) for m in range(0, 45)]
+
+
+@pytest.mark.parametrize("name", CATALOGS)
+def test_choosers_match_baseline(name):
+    paths = CATALOGS[name]
+    catalog = ImageCatalog(paths)
+    idx = {p.stem.lower(): p for p in paths}
+    for c, m in QUERIES:
+        cell_str, meas_str = f"{c:02d}", f"{m:04d}"
+        assert choose_rapid_image(catalog, cell_str, meas_str) == baseline_rapid(idx, cell_str, meas_str)
+        assert choose_rate_image(catalog, cell_str, meas_str) == baseline_rate(stem_for(cell_str, meas_str), idx)
+
+
+@pytest.mark.parametrize("name", CATALOGS)
+def test_resolve_rate_matches_rate(name):
+    catalog = ImageCatalog(CATALOGS[name])
+    cells, meas = zip(*QUERIES)
+    assert catalog.resolve_rate(cells, meas) == [catalog.rate(c, m) for c, m in QUERIES]
+    assert catalog.resolve_rate([], []) == []
+
+
+def test_rate_tie_goes_to_lower_meas():
+    catalog = ImageCatalog(CATALOGS["tie"])
+    assert catalog.rate(1, 5).name == catalog.resolve_rate([1], [5])[0].name == "cell01meas0002.tif"
@@ -0,0 +1,57 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from afm_cell_training import writers
+from afm_cell_training.cli import main
+from afm_cell_training.orchestrator import RunOrchestrator
+from afm_cell_training.pipeline import MaskPipeline
+
+H, W = 48, 64
+
+
+def make_dataset(root, n=4):
+    ds = root / "DN1-rapid"
+    ds.mkdir(parents=True)
+    ann = {}
+    for m in range(n):
+        cv2.imwrite(str(ds / f"cell01meas{m:04d}.tif"), np.full((H, W, 3), 30 * m, np.uint8))
+        ann[f"('01', '{m:04d}')"] = {"selection": "manual", "clickData": [[[5, 5], [30, 5], [30, 30]]]}
+    (ds / f"{ds.name}_im_annotations.json").write_text(json.dumps(ann))
+    return ds
+
+
+def test_run_writes_stats_and_export(tmp_path):
+    make_dataset(tmp_path / "data")
+    orch = RunOrchestrator(MaskPipeline(tmp_path / "data"), tmp_path / "results", tmp_path / "export")
+    (report,) = orch.run()
+    assert report.made == 4 and len(orch.frames) == 4
+    assert len(list((tmp_path / "export").glob("*_masks.png"))) == 4
+    assert (tmp_path / "results" / "frame_stats.csv").read_text().count("\n") == 5
+
+
+def test_encode_error_is_counted_not_raised(tmp_path, monkeypatch):
+    make_dataset(tmp_path / "data")
+    encode = writers.ImageWriter.encode
+    calls = []
+
+    def flaky(self, img):
+        calls.append(1)
+        if len(calls) == 2:
+            raise cv2.error("boom")
+        return encode(self, img)
+
+    monkeypatch.setattr(writers.ImageWriter, "encode", flaky)
+    orch = RunOrchestrator(MaskPipeline(tmp_path / "data", overlays=False), tmp_path / "results")
+    (report,) = orch.run()
+    assert (report.made, report.miss, len(orch.frames)) == (3, 1, 3)
+    assert any("encode failed" in m for m in report.messages)
+
+
+def test_run_cannot_resume(tmp_path):
+    with pytest.raises(ValueError):
+        RunOrchestrator(MaskPipeline(tmp_path, resume=True))
+    with pytest.raises(SystemExit):
+        main(["run", str(tmp_path), "--resume"])
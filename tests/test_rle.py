@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from afm_cell_training.masks import rasterize_mask
+from afm_cell_training.rle import RLEMask
+
+H, W = 37, 53
+
+
+def random_mask(rng, density):
+    return np.where(rng.random((H, W)) < density, 255, 0).astype(np.uint8)
+
+
+MASKS = {
+    "empty": np.zeros((H, W), np.uint8),
+    "full": np.full((H, W), 255, np.uint8),
+    "first_pixel": np.pad(np.full((1, 1), 255, np.uint8), ((0, H - 1), (0, W - 1))),
+    "last_pixel": np.pad(np.full((1, 1), 255, np.uint8), ((H - 1, 0), (W - 1, 0))),
+    "sparse": random_mask(np.random.default_rng(0), 0.05),
+    "dense": random_mask(np.random.default_rng(1), 0.7),
+    "labels": np.random.default_rng(2).integers(0, 3, (H, W)).astype(np.uint16),
+}
+
+
+@pytest.mark.parametrize("name", MASKS)
+def test_encode_decode_roundtrip(name):
+    mask = MASKS[name]
+    rle = RLEMask.encode(mask)
+    assert np.array_equal(rle.decode(), np.where(mask != 0, 255, 0).astype(np.uint8))
+    assert rle.area == int((mask != 0).sum())
+    assert int(rle.counts.sum()) == H * W
+
+
+@pytest.mark.parametrize("name", MASKS)
+def test_bbox_matches_dense(name):
+    mask = MASKS[name]
+    ys, xs = np.nonzero(mask)
+    expected = None if not len(xs) else (xs.min(), ys.min(), xs.max() + 1, ys.max() + 1)
+    assert RLEMask.encode(mask).bbox == expected
+
+
+def test_from_polygons_matches_rasterized_mask():
+    polygons = [[[3, 4], [20, 2], [25, 30], [5, 33]], [[40, 10], [60, 12], [45, 50]], [[1, 1], [2, 2]]]
+    assert RLEMask.from_polygons(H, W, polygons) == RLEMask.encode(rasterize_mask(H, W, polygons))
+    assert RLEMask.from_polygons(H, W, []).area == 0
+
+
+@pytest.mark.parametrize("a, b", [("sparse", "dense"), ("empty", "dense"), ("full", "sparse"),
+                                  ("first_pixel", "last_pixel"), ("dense", "dense")])
+def test_set_operations_match_dense(a, b):
+    ma, mb = MASKS[a] != 0, MASKS[b] != 0
+    ra, rb = RLEMask.encode(ma), RLEMask.encode(mb)
+    assert (ra | rb) == RLEMask.encode(ma | mb)
+    assert (ra & rb) == RLEMask.encode(ma & mb)
+    union = (ma | mb).sum()
+    assert ra.iou(rb) == pytest.approx((ma & mb).sum() / union if union else 1.0)
+
+
+def test_shape_mismatch_raises():
+    with pytest.raises(ValueError):
+        RLEMask.encode(MASKS["dense"]).iou(RLEMask.encode(np.zeros((W, H), np.uint8)))
+
+
+@pytest.mark.parametrize("name", MASKS)
+@pytest.mark.parametrize("compressed", [False, True])
+def test_coco_roundtrip(name, compressed):
+    rle = RLEMask.encode(MASKS[name])
+    coco = rle.to_coco(compressed)
+    assert coco["size"] == [H, W]
+    assert isinstance(coco["counts"], str if compressed else list)
+    assert RLEMask.from_coco(coco) == rle
+    if compressed:
+        assert RLEMask.from_coco({**coco, "counts": coco["counts"].encode()}) == rle
+
+
+@pytest.mark.parametrize("name", MASKS)
+def test_coco_string_matches_pycocotools(name):
+    mask_util = pytest.importorskip("pycocotools.mask")
+    dense = np.asfortranarray((MASKS[name] != 0).astype(np.uint8))
+    ref = mask_util.encode(dense)
+    assert RLEMask.encode(MASKS[name]).to_coco(compressed=True)["counts"] == ref["counts"].decode()
+    assert RLEMask.from_coco(ref) == RLEMask.encode(dense)
@@ -0,0 +1,21 @@
+import cv2
+import numpy as np
+import pytest
+
+from afm_cell_training.tiff import image_size, read_png_size
+
+
+@pytest.mark.parametrize("ext", [".png", ".tif"])
+@pytest.mark.parametrize("shape, dtype", [((33, 71), np.uint8), ((20, 9, 3), np.uint8), ((5, 6), np.uint16)])
+def test_image_size_reads_headers(tmp_path, ext, shape, dtype):
+    path = tmp_path / f"x{ext}"
+    cv2.imwrite(str(path), np.zeros(shape, dtype))
+    assert image_size(path) == shape[:2]
+    assert (read_png_size(path) is not None) == (ext == ".png")
+
+
+def test_png_size_of_non_png(tmp_path):
+    path = tmp_path / "x.png"
+    path.write_bytes(b"\x89PNG\r\n")
+    assert read_png_size(path) is None
+    assert read_png_size(tmp_path / "missing.png") is None
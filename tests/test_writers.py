@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from afm_cell_training.writers import MASK_SUFFIXES, WRITERS, mask_stem, read_mask
+
+BAD = {"channels": np.zeros((4, 4, 5), np.uint8), "empty": np.zeros((0, 0), np.uint8)}
+
+
+@pytest.mark.parametrize("name", [n for n in WRITERS if WRITERS[n].encoder != "npy"])
+@pytest.mark.parametrize("bad", BAD)
+def test_failed_encode_is_reported_not_raised(tmp_path, name, bad):
+    if name == "png-palette":
+        pytest.importorskip("PIL")
+    path = tmp_path / f"x{WRITERS[name].ext}"
+    assert WRITERS[name].write(path, BAD[bad]) is False
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("name", [n for n in WRITERS if WRITERS[n].for_masks])
+def test_masks_roundtrip_through_every_mask_writer(tmp_path, name):
+    mask = np.zeros((12, 20), np.uint8)
+    mask[3:9, 5:15] = 255
+    path = tmp_path / f"cell01meas0000_mask{WRITERS[name].ext}"
+    assert WRITERS[name].write(path, mask)
+    assert mask_stem(path.name) == "cell01meas0000" and path.name.endswith(MASK_SUFFIXES)
+    assert np.array_equal(read_mask(path) != 0, mask != 0)